@@ -1,14 +1,43 @@
 import argparse
+from multiprocessing import Pool
 from dwca.read import DwCAReader
 from dwca.darwincore.utils import qualname as qn
 from dwca.read import DwCAReader
 from dwca.descriptors import DataFileDescriptor
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import re
-from lxml import html
+import html
+from lxml import html as lxml_html
+
+# Matches HTML tags such as <p>, </i> or <br/>
+TAG_RE = re.compile(r'<[A-Za-z/!][^>]*>')
 
 def strip_html(s):
-    return str(html.fragment_fromstring(s, create_parent = True).text_content())
+    # Remove the tags with a regex, which is enough for the simple markup used in descriptions
+    stripped = TAG_RE.sub('', s)
+    # Fall back to parsing the description with lxml if any stray markup remains
+    if '<' in stripped or '>' in stripped:
+        return str(lxml_html.fragment_fromstring(s, create_parent = True).text_content())
+    return html.unescape(stripped)
+
+def rename_row(data, map_header, renamed_keys):
+    # Rename the keys of a dict format row with the header mapper's get method; the renamed keys are
+    # cached in renamed_keys for each key order, which is normally the same for every row of an archive
+    keys = tuple(data)
+    if not keys in renamed_keys:
+        renamed_keys[keys] = [map_header(key, key) for key in keys]
+    return dict(zip(renamed_keys[keys], data.values()))
+
+def append_row(cols, nrows, row):
+    # Append the values of a dict format row to the per-column lists, padding with None
+    # for columns that are missing from either the row or the rows before it
+    for key, value in row.items():
+        cols.setdefault(key, [None] * nrows).append(value)
+    for col in cols.values():
+        if len(col) == nrows:
+            col.append(None)
         
 def dwca2df(dwcafile):
     with DwCAReader(dwcafile) as dwca:
@@ -21,15 +50,20 @@ def dwca2df(dwcafile):
         for header in missing_headers:
             header_mapper[header['term']] = re.sub("^.*\/", "", header['term'])
         
-        # Now we collate the dict format core rows
-        rows = []
+        # Now we collate the core rows into one list per column
+        cols = {}
+        nrows = 0
+        # Bind the header mapper lookup locally and cache the renamed keys
+        map_header = header_mapper.get
+        renamed_keys = {}
         # Iterate over all core rows
         for row in dwca.rows:
-            row_renamed = {header_mapper.get(key, key): value for key, value in row.data.items()}
-            rows.append(row_renamed)
+            row_renamed = rename_row(row.data, map_header, renamed_keys)
+            append_row(cols, nrows, row_renamed)
+            nrows += 1
 
-        # Convert our list of dictionaries to a pandas dataframe
-        df = pd.DataFrame(rows)
+        # Convert our dictionary of columns to a pandas dataframe
+        df = pd.DataFrame(cols, copy = False)
 
         return df
 
@@ -48,27 +82,40 @@ def dwcaext2df(dwcafile, extensiontype="http://rs.gbif.org/terms/1.0/Description
         for header in missing_headers:
             header_mapper[header['term']] = re.sub("^.*\/", "", header['term'])
 
-        # Now we collate the dict format rows for the selected extension type
-        ext_rows = []
+        # Now we collate the rows for the selected extension type into one list per column
+        ext_cols = {}
+        ext_nrows = 0
+        # Bind the header mapper lookup locally and cache the renamed keys
+        map_header = header_mapper.get
+        renamed_keys = {}
         # Iterate over all core rows
         for row in dwca.rows:
             # Iterate over all the extensions for this core row
             for extension_line in row.extensions:
                 if extension_line.rowtype == extensiontype:
                     # We use the header mapper to shorten the key names
-                    extension_line_renamed = {header_mapper.get(key, key): value for key, value in extension_line.data.items()}
-                    # Remove HTML tags from the description column
-                    extension_line_renamed['description'] = strip_html(extension_line_renamed['description'])
+                    extension_line_renamed = rename_row(extension_line.data, map_header, renamed_keys)
                     # Add a coreid if its not there already
                     if not 'coreid' in extension_line_renamed.keys():
                         extension_line_renamed['coreid'] = row.id
-                    ext_rows.append(extension_line_renamed)
+                    append_row(ext_cols, ext_nrows, extension_line_renamed)
+                    ext_nrows += 1
 
-        # Convert our list of dictionaries to a pandas dataframe
-        df = pd.DataFrame(ext_rows)
+        # Remove HTML tags from the description column, spreading the rows over worker processes
+        if 'description' in ext_cols:
+            with Pool() as pool:
+                ext_cols['description'] = list(pool.imap(strip_html, ext_cols['description'], chunksize = 256))
+
+        # Convert our dictionary of columns to a pandas dataframe
+        df = pd.DataFrame(ext_cols, copy = False)
 
         return df
 
+def write_tsv(df, outputfile):
+    # Write the dataframe as a tab-separated file using pyarrow's multithreaded CSV writer
+    table = pa.Table.from_pandas(df, preserve_index = False)
+    pacsv.write_csv(table, outputfile, write_options = pacsv.WriteOptions(delimiter = '\t', include_header = True))
+
 def main():
     # Create the parser
     parser = argparse.ArgumentParser(description='Explore DWCA format description files')
@@ -85,11 +132,11 @@ def main():
     if args.output_type == 'core':
         df_core = dwca2df(args.inputfile)
         fields = ['coreid'] + [col for col in df_core.columns if col != 'coreid']
-        df_core[fields].to_csv(args.outputfile, sep='\t', index=False)
+        write_tsv(df_core[fields], args.outputfile)
     elif args.output_type == 'desc':
         df_desc = dwcaext2df(args.inputfile)
         fields = ['coreid'] + [col for col in df_desc.columns if col != 'coreid']
-        df_desc[fields].to_csv(args.outputfile, sep='\t', index=False)
+        write_tsv(df_desc[fields], args.outputfile)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -24,7 +24,6 @@ class TraitAccumulator(LLMCharProcessor):
                  accum_prompt:str,
                  base_llm:str,
                  llm_params:dict,
-                 llm_name:str = 'desc2matrix',
                  host_url:str = 'http://localhost:11434'):
         """
         Initialise trait accumulator.
@@ -35,12 +34,11 @@ class TraitAccumulator(LLMCharProcessor):
             accum_prompt (str): The prompt to use for trait accumulation
             base_llm (str): Name of the base LLM to use
             llm_params (dict): Dictionary specifying model parameters as specified here: https://github.com/ollama/ollama/blob/main/docs/modelfile.md
-            llm_name (str): The name of the model to create. Defaults to 'desc2matrix'
             host_url (str): The Ollama host url to use. Defaults to 'http://localhost:11434'
         """
         
         # Run super initialiser
-        super().__init__(sys_prompt, base_llm, llm_params, llm_name, host_url)
+        super().__init__(sys_prompt, base_llm, llm_params, host_url)
 
         # Store parameters
         self.init_prompt = init_prompt
@@ -126,8 +124,7 @@ class TraitAccumulator(LLMCharProcessor):
         last_charlist = self.charlist_history[len(self.charlist_history) - 1]
 
         # Prepare prompt
-        prompt_wcontent = self.accum_prompt.replace('[DESCRIPTION]', desc) # Insert species description
-        prompt_wcontent = prompt_wcontent.replace('[CHARACTER_LIST]', '; '.join(last_charlist)) # Insert characteristics
+        prompt_wcontent = self.fill_prompt(self.accum_prompt, {'DESCRIPTION': desc, 'CHARACTER_LIST': '; '.join(last_charlist)}) # Insert species description and characteristics
 
         # Generate output with predetermined character list
         char_json = self.prompt2charjson(prompt_wcontent, show_log = show_log)
@@ -246,7 +243,7 @@ class TabTraitAccumulator(TraitAccumulator):
         
         # Generate LLM output for the description
         # NB: The regulariser for table output must be used here.
-        char_json = self.prompt2charjson(prompt_wcontent, regulariser = regularise.regularise_table, show_log = show_log)
+        char_json = self.prompt2charjson(prompt_wcontent, regulariser = regularise.regularise_table, output_schema = regularise.TABLE_SCHEMA, show_log = show_log)
 
         # If we need to store the results
         if store_results:
@@ -275,7 +272,6 @@ class FollowupTraitAccumulator(TraitAccumulator):
                  f_prompt:str,
                  base_llm:str,
                  llm_params:dict,
-                 llm_name:str = 'desc2matrix',
                  host_url:str = 'http://localhost:11434'):
         """
         Initialise trait accumulator.
@@ -287,7 +283,6 @@ class FollowupTraitAccumulator(TraitAccumulator):
             f_prompt (str): The follow-up prompt
             base_llm (str): Name of the base LLM to use
             llm_params (dict): Dictionary specifying model parameters as specified here: https://github.com/ollama/ollama/blob/main/docs/modelfile.md
-            llm_name (str): The name of the model to create. Defaults to 'desc2matrix'
             host_url (str): The Ollama host url to use. Defaults to 'http://localhost:11434'
         """
 
@@ -295,7 +290,7 @@ class FollowupTraitAccumulator(TraitAccumulator):
         self.f_prompt = f_prompt
 
         # Run superclass initiator to store parameters and initialist Ollama model
-        super().__init__(sys_prompt, init_prompt, accum_prompt, base_llm, llm_params, llm_name, host_url)
+        super().__init__(sys_prompt, init_prompt, accum_prompt, base_llm, llm_params, host_url)
 
     def accum_step(self, spid:str, desc:str, show_log:bool = False, store_results:bool = True) -> dict:
         """
@@ -346,26 +341,28 @@ class FollowupTraitAccumulator(TraitAccumulator):
             # Retrieve omissions
             omissions = process_words.get_omissions(desc, init_charjson_dat)
 
-            # Build the follow-up prompt
-            followup_prompt = self.f_prompt.replace('[DESCRIPTION]', desc).replace('[MISSING_WORDS]', '; '.join(sorted(omissions))).replace('[CHARACTER_LIST]', '; '.join(last_charlist))
+            # Ask the follow-up question unless no words were omitted
+            if len(omissions) > 0:
+                # Build the follow-up prompt
+                followup_prompt = self.fill_prompt(self.f_prompt, {'DESCRIPTION': desc, 'MISSING_WORDS': '; '.join(sorted(omissions)), 'CHARACTER_LIST': '; '.join(last_charlist)})
 
-            # Build the messages
-            messages = [
-                {'role': 'system', 'content': self.sys_prompt}, 
-                {'role': 'user', 'content': self.accum_prompt.replace('[DESCRIPTION]', desc)},
-                {'role': 'assistant', 'content': json.dumps(init_charjson_dat, indent=4)}, # 'Simulate' the previous model output
-                {'role': 'user', 'content': followup_prompt}
-            ]
+                # Build the messages
+                messages = [
+                    {'role': 'system', 'content': self.sys_prompt}, 
+                    {'role': 'user', 'content': self.accum_prompt.replace('[DESCRIPTION]', desc)},
+                    {'role': 'assistant', 'content': json.dumps(init_charjson_dat, indent=4)}, # 'Simulate' the previous model output
+                    {'role': 'user', 'content': followup_prompt}
+                ]
 
-            # Generate followup response
-            f_char_json = self.messages2charjson(messages, show_log = show_log)
+                # Generate followup response
+                f_char_json = self.messages2charjson(messages, show_log = show_log)
 
-            # Add '_followup' to status code if the output failed to parse
-            if f_char_json['status'] != 'success':
-                f_char_json['status'] = '{}_followup'.format(f_char_json['status'])
+                # Add '_followup' to status code if the output failed to parse
+                if f_char_json['status'] != 'success':
+                    f_char_json['status'] = '{}_followup'.format(f_char_json['status'])
 
-            # Set char_json as f_char_json
-            char_json = f_char_json
+                # Set char_json as f_char_json
+                char_json = f_char_json
 
         # If we need to store the results in the object
         if store_results:
@@ -13,6 +13,7 @@ You must answer in valid JSON, with no other text.
 # Prompt used for extracting a given list of characteristics
 # [DESCRIPTION] in the prompt text is replaced by the plant description.
 # [CHARACTER_LIST] in the prompt text is replaced by the list of characteristics to extract.
+# [DESCRIPTION] is kept at the end so that the rest of the prompt is identical across species and can be cached by Ollama.
 global_prompt = """
 You are given a botanical description of a plant species taken from published floras.
 You extract the types of characteristics mentioned in the description and their corresponding values, and transcribe them into JSON.
@@ -50,6 +51,48 @@ Here is the description that you should transcribe:
 [DESCRIPTION]
 """
 
+# Prompt used for extracting a given list of characteristics from several species in one run, used with --batchsize in desc2matrix_wcharlist.py
+# [DESCRIPTIONS] in the prompt text is replaced by a structured list of plant descriptions.
+# [CHARACTER_LIST] in the prompt text is replaced by the list of characteristics to extract.
+# [DESCRIPTIONS] is kept at the end so that the rest of the prompt is identical across batches and can be cached by Ollama.
+global_batch_prompt = """
+You are given botanical descriptions of a few plant species taken from published floras. Each description is preceded by the ID of the species.
+For each species, you extract the types of characteristics mentioned in its description and their corresponding values, and transcribe them into JSON.
+Your answer should be a JSON object with the ID of every species as a key. The value for each species should be an array of JSON with name of the characteristic and the corresponding value formatted as follows: {"characteristic":(name of characteristic), "value":(value of characteristic)}.
+(name of characteristic) should be substituted with the name of the characteristic, and (value of characteristic) should be substituted with the corresponding value.
+The name of every characteristic must be written in lowercase.
+Make sure that you surround your final answer with curly brackets { and } so that it is a valid JSON object, and that the answer for each species is surrounded by square brackets [ and ].
+Transcribe each description separately; do not mix up characteristics between species.
+Do not include any text (e.g. introductory text) other than the valid JSON object.
+
+Follow the instructions below.
+
+1. Transcribe all the mentioned characteristics relating to the whole plant, such as growth form, reproduction, plant height, and branching.
+
+2. Iterate through every mentioned organs (e.g. leaf and other leaf-like organs, stem, flower, inflorescence, fruit, seed and root) and parts of organs (e.g. stipule, anther, ovary) and transcribe their corresponding characteristics.
+You must transcribe the length, width, shape, colour, surface texture, surface features, and arrangement of each organ or part of an organ.
+Each of these characteristics must be separate. The name of every characteristic relating to an organ or a part of an organ must be formatted as follows: "(name of organ or part of organ) (type of characteristic)", where (name of organ or part of organ) should be substituted with the name of the organ or part of the organ, and (type of characteristic) should be substituted with the specific type of characteristic.
+
+In the final output JSON, try to include all words that appear in the given descriptions, as long as they carry information about the plant species.
+Do not make up characteristics that are not mentioned in the description.
+
+Here are some examples of descriptions and their correponding transcription in JSON for a single species:
+
+Sentence: "Fruit: ovoid berry, 10-12 mm wide, 13-15 mm long, yellow to yellow-green throughout."
+JSON: [{"characteristic": "fruit shape", "value": "ovoid"}, {"characteristic": "fruit type", "value": "berry"}, {"characteristic": "fruit width", "value": "10-12 mm"}, {"characteristic": "fruit length", "value": "13-15 mm"}, {"characteristic": "fruit colour", "value": "yellow to yellow-green"}]
+
+Sentence: "Perennial dioecious herbs 60-100cm tall. Leaves alternate, green and glabrous adaxially and hirsute with white to greyish hair abaxially."
+JSON: [{"characteristic": "life history", "value": "perennial"}, {"characteristic": "reproduction", "value": "dioecious"}, {"characteristic": "growth form", "value": "herb"}, , {"characteristic": "plant height", "value": "60-100 cm"}, {"characteristic": "leaf arrangement", "value": "alternate"}, {"characteristic": "leaf adaxial colour", "value": "green"}, {"characteristic": "leaf adaxial texture", "value": "glabrous"}, {"characteristic": "leaf abaxial texture", "value": "hirsute"}, {"characteristic": "leaf abaxial hair colour", "value": "white to greyish"}]
+
+Include the following list of characteristics in the output for every species. Use the name of the characteristic as given in this list. If you can't find one or more of these characteristics in the description of a species, put "NA" as the corresponding value for that species. If you find a characteristic in a description that is not in this list, add that characteristic in the response for that species.
+
+[CHARACTER_LIST]
+
+Here are the descriptions that you should transcribe:
+
+[DESCRIPTIONS]
+"""
+
 # Prompt used to populate initial list of characteristics without tabulation
 # [DESCRIPTION] in the prompt text is replaced by the plant description.
 global_init_prompt = """
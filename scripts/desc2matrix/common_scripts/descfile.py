@@ -0,0 +1,66 @@
+"""
+Script for reading the species descriptions from a descfile, without loading the whole file into memory at once.
+"""
+
+from typing import List, Tuple, Optional, Iterator
+import pandas as pd
+
+# Number of rows of the descfile to read at once
+READ_CHUNKSIZE = 4096
+
+def iter_descs(descfile:str, desctype:str, start:int = 0, spnum:Optional[int] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Iterate over the species IDs and descriptions of a given type in a descfile.
+    The descfile is read in chunks, and only the needed columns are parsed.
+
+    Parameters:
+        descfile (str): Path to the tab-separated descfile
+        desctype (str): Name of the 'type' that contains the descriptions to read
+        start (int): Order ID (starting from 0) of the description of the given type to start reading from
+        spnum (Optional[int]): Number of descriptions to read; None to read all descriptions from start
+
+    Returns:
+        descs (Iterator[Tuple[str, str]]): Iterator over (coreid, description) pairs
+    """
+
+    # Number of matching rows seen so far
+    rowid = 0
+    # Stop position, if any
+    stop = start + spnum if spnum != None else None
+
+    # Read descfile in chunks, only keeping the needed columns
+    # Empty descriptions are read as '' rather than NaN, so that they can be handled as strings
+    reader = pd.read_csv(descfile, sep = '\t', usecols = ['coreid', 'type', 'description'], dtype = str, keep_default_na = False, chunksize = READ_CHUNKSIZE)
+    with reader:
+        for chunk in reader:
+            # Filter descriptions of the given type only
+            chunk = chunk.loc[chunk['type'] == desctype]
+            for spid, desc in zip(chunk['coreid'], chunk['description']):
+                if stop != None and rowid >= stop:
+                    return
+                if rowid >= start:
+                    yield spid, desc
+                rowid += 1
+
+def read_descs(descfile:str, desctype:str, start:int = 0, spnum:Optional[int] = None) -> Tuple[List[str], List[str]]:
+    """
+    Read the species IDs and descriptions of a given type in a descfile. See iter_descs().
+
+    Parameters:
+        descfile (str): Path to the tab-separated descfile
+        desctype (str): Name of the 'type' that contains the descriptions to read
+        start (int): Order ID (starting from 0) of the description of the given type to start reading from
+        spnum (Optional[int]): Number of descriptions to read; None to read all descriptions from start
+
+    Returns:
+        spids (List[str]): List of species IDs
+        descs (List[str]): List of descriptions, in the same order as spids
+    """
+
+    spids = []
+    descs = []
+    for spid, desc in iter_descs(descfile, desctype, start, spnum):
+        spids.append(spid)
+        descs.append(desc)
+
+    return spids, descs
@@ -2,11 +2,13 @@
 Script for defining TraitExtractor classes.
 """
 
-from typing import List
+from typing import List, Dict, Optional
 import time
 import json
+import asyncio
+import re
 
-from common_scripts import process_words
+from common_scripts import process_words, regularise
 from common_scripts.llmcharprocessor import LLMCharProcessor
 
 class TraitExtractor(LLMCharProcessor):
@@ -17,14 +19,30 @@ class TraitExtractor(LLMCharProcessor):
     # Run mode name in the summary output
     RUN_MODE_NAME = 'desc2json_wcharlist'
 
+    # Lower bound of num_predict when it is fitted to the description
+    MIN_NUM_PREDICT = 256
+
+    # Rough number of characters per token, used for estimating the length of the batch prompts
+    CHARS_PER_TOKEN = 4
+
+    # Minimum length of a description that is sent to the LLM when skip_trivial is True
+    MIN_DESC_LEN = 40
+
+    # Plant parts / habits, at least one of which must be mentioned in a description that is sent to the LLM when skip_trivial is True
+    TRIGGER_RE = re.compile(r'\b(?:leaf|leaves|leaflets?|stems?|branch(?:es|lets?)?|twigs?|bark|flowers?|inflorescences?|petals?|sepals?|calyx|corolla|stamens?|anthers?|ovary|fruits?|seeds?|roots?|plants?|herbs?|shrubs?|trees?|climbers?)\b', re.IGNORECASE)
+
     def __init__(self,
                  sys_prompt:str,
                  ext_prompt:str,
                  ext_chars:List[str],
                  base_llm:str,
                  llm_params:dict,
-                 llm_name:str = 'desc2matrix',
-                 host_url:str = 'http://localhost:11434'):
+                 host_url:str = 'http://localhost:11434',
+                 max_concurrency:int = 4,
+                 cache_path:Optional[str] = None,
+                 fit_num_predict:bool = False,
+                 batch_prompt:Optional[str] = None,
+                 skip_trivial:bool = False):
         """
         Initialise trait extractor.
 
@@ -34,28 +52,162 @@ class TraitExtractor(LLMCharProcessor):
             ext_chars (List[str]): The list of characteristics to extract
             base_llm (str): Name of the base LLM to use
             llm_params (dict): Dictionary specifying model parameters as specified here: https://github.com/ollama/ollama/blob/main/docs/modelfile.md
-            llm_name (str): The name of the model to create. Defaults to 'desc2matrix'
             host_url (str): The Ollama host url to use. Defaults to 'http://localhost:11434'
+            max_concurrency (int): Maximum number of asynchronous requests sent to the Ollama server at once. Defaults to 4
+            cache_path (Optional[str]): Path of the shelve file used to cache the LLM responses across runs. Responses are not cached if this is None. Defaults to None
+            fit_num_predict (bool): If this is True, num_predict is lowered for each description to an estimate of the output length, capped at the num_predict in llm_params. Defaults to False
+            batch_prompt (Optional[str]): The prompt to use for extracting the traits of several species in one run with ext_batch_async(). Defaults to None
+            skip_trivial (bool): If this is True, descriptions that are shorter than MIN_DESC_LEN or do not mention any plant part are not sent to the LLM; see is_trivial(). Defaults to False
         """
 
         # Run super initialiser
-        super().__init__(sys_prompt, base_llm, llm_params, llm_name, host_url)
+        super().__init__(sys_prompt, base_llm, llm_params, host_url, max_concurrency, cache_path)
+
+        # Store whether to fit num_predict to each description
+        self.fit_num_predict = fit_num_predict
+
+        # Store whether to skip trivial descriptions
+        self.skip_trivial = skip_trivial
 
         # Store ext_prompt and ext_chars
         self.ext_prompt = ext_prompt
         self.ext_chars = ext_chars
+
+        # Insert characteristics into the extraction prompt once, as they are the same for every species
+        self.ext_prompt_wchars = self.ext_prompt.replace('[CHARACTER_LIST]', '; '.join(self.ext_chars))
+
+        # Split the prompt around the description once so that every species shares a byte-identical prefix,
+        # which lets the Ollama server reuse the cached prefix across species
+        self.ext_prompt_prefix, _, self.ext_prompt_suffix = self.ext_prompt_wchars.partition('[DESCRIPTION]')
+
+        # Store the batch prompt and insert the characteristics into it once
+        self.batch_prompt = batch_prompt
+        self.batch_prompt_wchars = self.batch_prompt.replace('[CHARACTER_LIST]', '; '.join(self.ext_chars)) if self.batch_prompt != None else None
+
+    def build_ext_prompt(self, desc:str) -> str:
+        """
+        Function for building the extraction prompt for a single species description.
+        The part of the prompt before [DESCRIPTION] is the same for every species.
+
+        Parameters:
+            desc (str): The description to insert into the prompt
+
+        Returns:
+            prompt_wcontent (str): The extraction prompt with the description and characteristics inserted
+        """
+
+        # Insert species description; any further [DESCRIPTION] markers are in the suffix
+        return self.ext_prompt_prefix + desc + self.ext_prompt_suffix.replace('[DESCRIPTION]', desc)
     
+    def is_trivial(self, desc:str) -> bool:
+        """
+        Function for checking whether a description is too short or does not mention any plant part, e.g. placeholders such as 'see previous species'.
+        Such descriptions are not sent to the LLM if skip_trivial is True.
+
+        Parameters:
+            desc (str): The description to check
+
+        Returns:
+            trivial (bool): True if the description is shorter than MIN_DESC_LEN or does not match TRIGGER_RE
+        """
+
+        return len(desc) < self.MIN_DESC_LEN or self.TRIGGER_RE.search(desc) == None
+
+    def estimate_output_tokens(self, desc:str, sp_num:int = 1) -> int:
+        """
+        Function for roughly estimating the number of tokens in the output for species descriptions:
+        about half a token per character of the description, which is transcribed into the JSON, and 16 tokens per characteristic in the list for each species.
+
+        Parameters:
+            desc (str): The description to extract the characteristics from, or all the descriptions in a batch
+            sp_num (int): The number of species the descriptions are from. Default is 1
+
+        Returns:
+            num_tokens (int): The estimated number of tokens in the output
+        """
+
+        return len(desc) // 2 + 16 * len(self.ext_chars) * sp_num
+
+    def pack_batches(self, descs:List[str], order:List[int], max_batchsize:int) -> List[List[int]]:
+        """
+        Function for packing descriptions into batches for ext_batch_async(), taking the descriptions in the given order.
+        A batch is closed once it has max_batchsize descriptions, or when adding the next description would make the estimated number of tokens
+        in the batch prompt and its output exceed num_ctx. A description that does not fit in num_ctx on its own is put in a batch by itself.
+
+        Parameters:
+            descs (List[str]): The descriptions to extract the characteristics from
+            order (List[int]): The indices of the descriptions in the order in which they are packed
+            max_batchsize (int): The maximum number of descriptions in a batch
+
+        Returns:
+            batches (List[List[int]]): The indices of the descriptions in each batch
+        """
+
+        # Context window size; batches are only limited by max_batchsize if this is not set
+        num_ctx = self.llm_options.get('num_ctx')
+
+        # Estimated number of tokens in the part of the batch prompt shared by all species
+        prompt_tokens = (len(self.sys_prompt) + len(self.batch_prompt_wchars)) // self.CHARS_PER_TOKEN
+
+        batches = []
+        batch = []
+        batch_tokens = prompt_tokens
+        for i in order:
+            # Estimated number of tokens that the description adds to the prompt and the output
+            desc_tokens = len(descs[i]) // self.CHARS_PER_TOKEN + self.estimate_output_tokens(descs[i])
+
+            # Close the batch if the description does not fit
+            if len(batch) > 0 and (len(batch) == max_batchsize or (num_ctx != None and batch_tokens + desc_tokens > num_ctx)):
+                batches.append(batch)
+                batch = []
+                batch_tokens = prompt_tokens
+
+            batch.append(i)
+            batch_tokens += desc_tokens
+
+        # Close the last batch
+        if len(batch) > 0:
+            batches.append(batch)
+
+        return batches
+
+    def get_ext_options(self, desc:str, sp_num:int = 1) -> Optional[dict]:
+        """
+        Function for getting the Ollama options to use for extracting the traits from species descriptions.
+        If fit_num_predict is True, num_predict is set to a rough estimate of the number of tokens in the output; see estimate_output_tokens().
+        The estimate is at least MIN_NUM_PREDICT and at most the num_predict in llm_params.
+
+        Parameters:
+            desc (str): The description to extract the characteristics from, or all the descriptions in a batch
+            sp_num (int): The number of species the descriptions are from. Default is 1
+
+        Returns:
+            options (Optional[dict]): The options to use, or None to use the options built from llm_params
+        """
+
+        if not self.fit_num_predict:
+            return None
+
+        # Estimate the output length
+        num_predict = max(self.MIN_NUM_PREDICT, self.estimate_output_tokens(desc, sp_num))
+
+        # Cap the estimate at the num_predict that was set, if any
+        if 'num_predict' in self.llm_options:
+            num_predict = min(num_predict, self.llm_options['num_predict'])
+
+        return {**self.llm_options, 'num_predict': num_predict}
+
     def ext_step(self, spid:str, desc:str, show_log:bool = False, store_results:bool = True) -> dict:
         """
         Function for a step in the extraction process, where the traits are extracted from an
         additional species. The traits are stored if store_results is True.
         This function returns the charjson produced by the given description structured as follows:
         {
-            'status': 'success' | 'bad_structure' | 'invalid_json',
+            'status': 'success' | 'bad_structure' | 'invalid_json' | 'skipped',
             'data': [
                 {'characteristic': (characteristic), 'value': (value)},
                 (...)
-            ] IF STATUS IS SUCCESS ELSE (string that failed to parse)
+            ] IF STATUS IS SUCCESS ELSE (string that failed to parse, or None if skipped)
         }
         
         Parameters:
@@ -77,23 +229,18 @@ class TraitExtractor(LLMCharProcessor):
             print('trait extraction: processing... ', end = '', flush = True)
             start = time.time()
 
-        # Prepare prompt
-        prompt_wcontent = self.ext_prompt.replace('[DESCRIPTION]', desc) # Insert species description
-        prompt_wcontent = prompt_wcontent.replace('[CHARACTER_LIST]', '; '.join(self.ext_chars)) # Insert characteristics
-        
-        # Generate output
-        char_json = self.prompt2charjson(prompt_wcontent, show_log = show_log)
+        if self.skip_trivial and self.is_trivial(desc): # If the description is not worth sending to the LLM
+            char_json = {'status': 'skipped', 'data': None}
+        else:
+            # Prepare prompt
+            prompt_wcontent = self.build_ext_prompt(desc) # Insert species description
+            
+            # Generate output
+            char_json = self.prompt2charjson(prompt_wcontent, options = self.get_ext_options(desc), show_log = show_log)
         
         # If we need to store the outputs
         if store_results:
-            # Update sp_chars
-            self.sp_chars.append({
-                'coreid': spid,
-                'status': char_json['status'], # Status: one of 'success', 'bad_structure', 'invalid_json'
-                'original_description': desc,
-                'char_json': char_json['data'] if char_json['status'] == 'success' else None, # Only use this if parsing succeeded
-                'failed_str': char_json['data'] if char_json['status'] != 'success' else None # Only use this if parsing failed
-            })
+            self.store_charjson(spid, desc, char_json)
 
         # Finish log
         if show_log:
@@ -102,6 +249,114 @@ class TraitExtractor(LLMCharProcessor):
 
         # Return extracted characteristics
         return char_json
+
+    async def ext_step_async(self, spid:str, desc:str, store_results:bool = True) -> dict:
+        """
+        Asynchronous version of ext_step(), used for extracting the traits of multiple species concurrently.
+        The returned charjson is structured in the same way as ext_step().
+        NB: When the results are stored, they are stored in the order in which the runs finish.
+        To preserve the order of the species, set store_results to False and call store_charjson() in order.
+
+        Parameters:
+            spid (str): The WFO species id corresponding to the description
+            desc (str): The description to extract the characteristics from
+            store_results (bool): If this is True, store the extracted characteristics and values in the object. Default is True
+
+        Returns:
+            char_json (dict): The char_json produced from the given description
+        """
+
+        if self.skip_trivial and self.is_trivial(desc): # If the description is not worth sending to the LLM
+            char_json = {'status': 'skipped', 'data': None}
+        else:
+            # Prepare prompt
+            prompt_wcontent = self.build_ext_prompt(desc) # Insert species description
+
+            # Generate output
+            char_json = await self.prompt2charjson_async(prompt_wcontent, options = self.get_ext_options(desc))
+
+        # If we need to store the outputs
+        if store_results:
+            self.store_charjson(spid, desc, char_json)
+
+        # Return extracted characteristics
+        return char_json
+
+    async def ext_batch_async(self, spids:List[str], descs:List[str]) -> List[dict]:
+        """
+        Function for extracting the traits of several species in one run using the batch prompt, so that the shared part of the prompt is processed once for the whole batch.
+        The LLM is asked for a JSON object with a charjson for each species ID. The charjson of any species that is missing or badly structured
+        in the batch output is extracted again from its description alone using ext_step_async().
+        The results are not stored; call store_charjson() for each species to store them.
+
+        Parameters:
+            spids (List[str]): The WFO species ids corresponding to the descriptions
+            descs (List[str]): The descriptions to extract the characteristics from
+
+        Returns:
+            char_jsons (List[dict]): The char_json for each species, in the same order as the descriptions and structured in the same way as ext_step()
+        """
+
+        # Leave out trivial descriptions, which are skipped by ext_step_async()
+        if self.skip_trivial and any(self.is_trivial(desc) for desc in descs):
+            batch_ids = [i for i, desc in enumerate(descs) if not self.is_trivial(desc)]
+            char_jsons = [{'status': 'skipped', 'data': None} for desc in descs]
+            if len(batch_ids) > 0:
+                batch_char_jsons = await self.ext_batch_async([spids[i] for i in batch_ids], [descs[i] for i in batch_ids])
+                for i, char_json in zip(batch_ids, batch_char_jsons):
+                    char_jsons[i] = char_json
+            return char_jsons
+
+        # Nothing to batch for a single species
+        if len(descs) == 1:
+            return [await self.ext_step_async(spids[0], descs[0], store_results = False)]
+
+        # Build description string
+        desc_str = '\n\n'.join(['Species ID: {}\n\nSpecies description:\n{}'.format(spid, desc) for spid, desc in zip(spids, descs)])
+
+        # Prepare prompt
+        prompt_wcontent = self.fill_prompt(self.batch_prompt_wchars, {'DESCRIPTIONS': desc_str}) # Insert species descriptions
+
+        # Generate output, constraining it to a charjson for every species in the batch
+        batch_json = await self.prompt2charjson_async(prompt_wcontent,
+                                                      regulariser = lambda resp_json: regularise.regularise_batch(resp_json, spids),
+                                                      output_schema = regularise.batch_schema(spids),
+                                                      options = self.get_ext_options(desc_str, len(descs)))
+
+        # Retrieve the charjson of each species from the batch output
+        sp_chars = batch_json['data'] if batch_json['status'] == 'success' else {}
+        char_jsons = [{'status': 'success', 'data': sp_chars[spid]} if sp_chars.get(spid) != None else None for spid in spids]
+
+        # Extract the traits of the species missing from the batch output separately, all at once
+        missing_ids = [i for i, char_json in enumerate(char_jsons) if char_json == None]
+        retried_char_jsons = await asyncio.gather(*[self.ext_step_async(spids[i], descs[i], store_results = False) for i in missing_ids])
+        for i, char_json in zip(missing_ids, retried_char_jsons):
+            char_jsons[i] = char_json
+
+        # Return extracted characteristics
+        return char_jsons
+
+    def store_charjson(self, spid:str, desc:str, char_json:dict) -> None:
+        """
+        Function for storing the char_json extracted from a species description in the object.
+
+        Parameters:
+            spid (str): The WFO species id corresponding to the description
+            desc (str): The description that the characteristics were extracted from
+            char_json (dict): The char_json produced from the description by ext_step() or ext_step_async()
+
+        Returns:
+            None
+        """
+
+        # Update sp_chars
+        self.sp_chars.append({
+            'coreid': spid,
+            'status': char_json['status'], # Status: one of 'success', 'bad_structure', 'invalid_json', 'skipped'
+            'original_description': desc,
+            'char_json': char_json['data'] if char_json['status'] == 'success' else None, # Only use this if parsing succeeded
+            'failed_str': char_json['data'] if char_json['status'] != 'success' else None # Only use this if parsing failed; None if skipped
+        })
     
     def get_summary(self) -> dict:
         """
@@ -151,8 +406,12 @@ class FollowupTraitExtractor(TraitExtractor):
                  ext_chars:List[str],
                  base_llm:str,
                  llm_params:dict,
-                 llm_name:str = 'desc2matrix',
-                 host_url:str = 'http://localhost:11434'):
+                 host_url:str = 'http://localhost:11434',
+                 max_concurrency:int = 4,
+                 cache_path:Optional[str] = None,
+                 fit_num_predict:bool = False,
+                 batch_prompt:Optional[str] = None,
+                 skip_trivial:bool = False):
         """
         Initialise trait extractor.
 
@@ -163,23 +422,61 @@ class FollowupTraitExtractor(TraitExtractor):
             ext_chars (List[str]): The list of characteristics to extract
             base_llm (str): Name of the base LLM to use
             llm_params (dict): Dictionary specifying model parameters as specified here: https://github.com/ollama/ollama/blob/main/docs/modelfile.md
-            llm_name (str): The name of the model to create. Defaults to 'desc2matrix'
             host_url (str): The Ollama host url to use. Defaults to 'http://localhost:11434'
+            max_concurrency (int): Maximum number of asynchronous requests sent to the Ollama server at once. Defaults to 4
+            cache_path (Optional[str]): Path of the shelve file used to cache the LLM responses across runs. Responses are not cached if this is None. Defaults to None
+            fit_num_predict (bool): If this is True, num_predict is lowered for each description to an estimate of the output length, capped at the num_predict in llm_params. Defaults to False
+            batch_prompt (Optional[str]): The prompt to use for extracting the traits of several species in one run with ext_batch_async(). Defaults to None
+            skip_trivial (bool): If this is True, descriptions that are shorter than MIN_DESC_LEN or do not mention any plant part are not sent to the LLM; see is_trivial(). Defaults to False
         """
 
         # Run super initialiser
-        super().__init__(sys_prompt, ext_prompt, ext_chars, base_llm, llm_params, llm_name, host_url)
+        super().__init__(sys_prompt, ext_prompt, ext_chars, base_llm, llm_params, host_url, max_concurrency, cache_path, fit_num_predict, batch_prompt, skip_trivial)
 
         # Store follow-up prompt
         self.f_prompt = f_prompt
 
+        # Insert characteristics into the follow-up prompt once, as they are the same for every species
+        self.f_prompt_wchars = self.f_prompt.replace('[CHARACTER_LIST]', '; '.join(self.ext_chars))
+
+    def build_followup_messages(self, desc:str, init_charjson_dat:List[dict]) -> Optional[List[Dict[str, str]]]:
+        """
+        Function for building the chat messages for the follow-up question, which asks the LLM about the words in the description
+        that are missing from the initial response.
+
+        Parameters:
+            desc (str): The description that the characteristics were extracted from
+            init_charjson_dat (List[dict]): The characteristics in the initial response, i.e. the 'data' of a successful char_json
+
+        Returns:
+            messages (Optional[List[Dict[str, str]]]): The messages to pass to messages2charjson(), or None if no words were omitted
+        """
+
+        # Retrieve omissions
+        omissions = process_words.get_omissions(desc, init_charjson_dat)
+
+        # There is nothing to ask if no words were omitted
+        if len(omissions) == 0:
+            return None
+
+        # Build the follow-up prompt
+        followup_prompt = self.fill_prompt(self.f_prompt_wchars, {'DESCRIPTION': desc, 'MISSING_WORDS': '; '.join(sorted(omissions))})
+
+        # Build the messages
+        return [
+            {'role': 'system', 'content': self.sys_prompt}, 
+            {'role': 'user', 'content': self.build_ext_prompt(desc)}, # Same prompt as the initial response
+            {'role': 'assistant', 'content': json.dumps(init_charjson_dat, indent=4)}, # 'Simulate' the previous model output
+            {'role': 'user', 'content': followup_prompt}
+        ]
+
     def ext_step(self, spid:str, desc:str, show_log:bool = False, store_results:bool = True) -> dict:
         """
         Function for a step in the extraction process, where the traits are extracted from an
         additional species. The traits are stored if store_results is True.
         This function returns the charjson produced by the given description structured as follows:
         {
-            'status': 'success' | 'bad_structure' | 'invalid_json' | 'bad_structure_followup' | 'invalid_json_followup',
+            'status': 'success' | 'bad_structure' | 'invalid_json' | 'skipped' | 'bad_structure_followup' | 'invalid_json_followup',
             'data': [
                 {'characteristic': (characteristic), 'values': {'species id 1': '', (...)}},
                 (...)
@@ -205,27 +502,10 @@ class FollowupTraitExtractor(TraitExtractor):
             print('follow-up question: processing... ', end = '', flush = True)
             start = time.time()
 
-        if(char_json['status'] != 'success'): # If initial JSON output was invalid or badly structured
-            # Just proceed to updating list of chracteristics
-            pass
-        else: # If the initial JSON output successfully parsed
-            # Extract the char_json response
-            init_charjson_dat = char_json['data']
-            
-            # Retrieve omissions
-            omissions = process_words.get_omissions(desc, init_charjson_dat)
-
-            # Build the follow-up prompt
-            followup_prompt = self.f_prompt.replace('[DESCRIPTION]', desc).replace('[MISSING_WORDS]', '; '.join(sorted(omissions))).replace('[CHARACTER_LIST]', '; '.join(self.ext_chars))
-
-            # Build the messages
-            messages = [
-                {'role': 'system', 'content': self.sys_prompt}, 
-                {'role': 'user', 'content': self.ext_prompt.replace('[DESCRIPTION]', desc)},
-                {'role': 'assistant', 'content': json.dumps(init_charjson_dat, indent=4)}, # 'Simulate' the previous model output
-                {'role': 'user', 'content': followup_prompt}
-            ]
+        # Build the follow-up messages from the initial response if the initial JSON output successfully parsed
+        messages = self.build_followup_messages(desc, char_json['data']) if char_json['status'] == 'success' else None
 
+        if messages != None: # Ask the follow-up question unless the initial output failed or no words were omitted
             # Generate followup response
             f_char_json = self.messages2charjson(messages, show_log = show_log)
 
@@ -238,14 +518,7 @@ class FollowupTraitExtractor(TraitExtractor):
         
         # If we need to store the outputs
         if store_results:
-            # Update sp_chars
-            self.sp_chars.append({
-                'coreid': spid,
-                'status': char_json['status'], # Status: one of 'success', 'bad_structure', 'invalid_json'
-                'original_description': desc,
-                'char_json': char_json['data'] if char_json['status'] == 'success' else None, # Only use this if parsing succeeded
-                'failed_str': char_json['data'] if char_json['status'] != 'success' else None # Only use this if parsing failed
-            })
+            self.store_charjson(spid, desc, char_json)
 
         # Finish log
         if show_log:
@@ -255,6 +528,44 @@ class FollowupTraitExtractor(TraitExtractor):
         # Return extracted characteristics
         return char_json
     
+    async def ext_step_async(self, spid:str, desc:str, store_results:bool = True) -> dict:
+        """
+        Asynchronous version of ext_step(), used for extracting the traits of multiple species concurrently.
+        The returned charjson is structured in the same way as ext_step().
+        NB: When the results are stored, they are stored in the order in which the runs finish.
+        To preserve the order of the species, set store_results to False and call store_charjson() in order.
+
+        Parameters:
+            spid (str): The WFO species id corresponding to the description
+            desc (str): The description to extract the characteristics from
+            store_results (bool): If this is True, store the extracted characteristics and values in the object. Default is True
+
+        Returns:
+            char_json (dict): The char_json produced from the given description
+        """
+
+        # Generate initial response without storing the results
+        char_json = await super().ext_step_async(spid, desc, store_results = False)
+
+        # Build the follow-up messages from the initial response if the initial JSON output successfully parsed
+        messages = self.build_followup_messages(desc, char_json['data']) if char_json['status'] == 'success' else None
+
+        # Ask the follow-up question unless the initial output failed or no words were omitted
+        if messages != None:
+            # Generate followup response
+            char_json = await self.messages2charjson_async(messages)
+
+            # Add '_followup' to status code if the output failed to parse
+            if char_json['status'] != 'success':
+                char_json['status'] = '{}_followup'.format(char_json['status'])
+
+        # If we need to store the outputs
+        if store_results:
+            self.store_charjson(spid, desc, char_json)
+
+        # Return extracted characteristics
+        return char_json
+    
     def get_summary(self) -> dict:
         """
         Function for getting the summary of the extraction run.
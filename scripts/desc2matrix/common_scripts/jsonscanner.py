@@ -0,0 +1,110 @@
+"""
+Script for defining the JSONStreamScanner class, which is used by LLMCharProcessor to stop reading streamed LLM responses early.
+"""
+
+import re
+
+class JSONStreamScanner:
+    """
+    Incremental scanner for a JSON value that is received in chunks, e.g. a streamed LLM response.
+    The scanner keeps track of the bracket depth outside of strings, so that it can tell when the top-level JSON value is complete,
+    or when the response does not contain a JSON array / object within its first MAX_PREAMBLE_CHUNKS chunks.
+    """
+
+    # Characters that affect the bracket depth or string state; all other characters are skipped over
+    STRUCT_CHAR_RE = re.compile(r'[\[\]{}"\\]')
+
+    # Characters opening the top-level JSON array / object
+    OPEN_CHAR_RE = re.compile(r'[\[{]')
+
+    # Number of chunks (about one token each) received without an opening bracket before giving up on the text being JSON
+    # Text before the opening bracket, e.g. a ```json fence or a short preamble, is allowed up to this limit
+    MAX_PREAMBLE_CHUNKS = 32
+
+    def __init__(self):
+        """
+        Initialise JSON stream scanner.
+        """
+
+        # The text received so far, cut off at the end of the top-level JSON value
+        self.text:str = ''
+
+        # Whether the scanner has finished, either because the JSON value is complete or because the text is not JSON
+        self.done:bool = False
+
+        # Whether the opening bracket of the top-level JSON value has been seen
+        self.started:bool = False
+
+        # Number of chunks received before the opening bracket
+        self.preamble_chunks:int = 0
+
+        # Whether there is text other than whitespace before the opening bracket
+        self.has_preamble:bool = False
+
+        # Current bracket depth outside of strings
+        self.depth:int = 0
+
+        # Whether the scanner is currently inside a string
+        self.in_string:bool = False
+
+        # Position in self.text of the character escaped by a backslash, if any
+        self.escaped_pos:int = -1
+
+    def feed(self, chunk:str) -> bool:
+        """
+        Function for feeding the next chunk of the text into the scanner.
+
+        Parameters:
+            chunk (str): The next chunk of the text
+
+        Returns:
+            done (bool): True if no more text is needed, i.e. the top-level JSON value is complete or no '[' or '{' was found within MAX_PREAMBLE_CHUNKS chunks
+        """
+
+        if self.done:
+            return True
+
+        # Position of the chunk in the full text
+        offset = len(self.text)
+
+        # Position in the chunk to start scanning from
+        scan_start = 0
+
+        # Look for the opening bracket of the JSON array / object
+        if not self.started:
+            open_match = self.OPEN_CHAR_RE.search(chunk)
+            if open_match == None: # No JSON yet
+                self.text += chunk
+                self.preamble_chunks += 1
+                if self.preamble_chunks >= self.MAX_PREAMBLE_CHUNKS: # Too long a preamble, or other non-JSON output; stop reading
+                    self.done = True
+                return self.done
+            self.started = True
+            self.has_preamble = (self.text + chunk[:open_match.start()]).strip() != ''
+            scan_start = open_match.start()
+
+        for match in self.STRUCT_CHAR_RE.finditer(chunk, scan_start):
+            char = match.group()
+            pos = offset + match.start()
+            if self.in_string:
+                if pos == self.escaped_pos: # Character escaped by a backslash
+                    continue
+                if char == '\\':
+                    self.escaped_pos = pos + 1
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '[{':
+                self.depth += 1
+            elif char in ']}':
+                self.depth -= 1
+                if self.depth == 0: # End of top-level JSON value
+                    # Drop anything after it, unless the text has a preamble and will fail to parse anyway,
+                    # in which case all of the text received is kept for failed_str
+                    self.text += chunk if self.has_preamble else chunk[:match.end()]
+                    self.done = True
+                    return True
+
+        self.text += chunk
+        return False
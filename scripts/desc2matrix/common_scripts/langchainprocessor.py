@@ -2,15 +2,17 @@
 Script for classes that process plant descriptions using LangChain.
 """
 
-from typing import List
+from typing import List, Any
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import Runnable
 from langchain_groq import ChatGroq
 import json
 import copy
 import time
 import ast
 import re
+import asyncio
 
 # ===== Data schema =====
 
@@ -45,13 +47,15 @@ class LangChainCharProcessor:
 
     def __init__(self,
                  base_llm:str,
-                 llm_params:dict):
+                 llm_params:dict,
+                 max_concurrency:int = 4):
         """
         Initialise trait extractor.
 
         Parameters:
             base_llm (str): Name of the LLM to use
             llm_params (dict): Dictionary specifying model parameters as seen here: https://api.python.langchain.com/en/latest/chat_models/langchain_groq.chat_models.ChatGroq.html
+            max_concurrency (int): Maximum number of asynchronous requests sent to the LLM at once. Defaults to 4
         """
 
         # Save the parameters
@@ -64,28 +68,25 @@ class LangChainCharProcessor:
             **self.llm_params
         )
 
+        # Wrap the LLM once so that it returns the Species schema; this is shared by all chains
+        self.struct_llm:Runnable = self.llm.with_structured_output(schema = Species, include_raw = True)
+
         # Variable to store the extracted characteristics data
         self.sp_chars:List[dict] = []
 
-    def desc2charjson(self, desc:str, sys_prompt:str, show_log:bool = False) -> dict:
+        # Semaphore limiting the number of asynchronous requests in flight
+        self.llm_semaphore:asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+
+    def build_chain(self, sys_prompt:str) -> Runnable:
         """
-        Internal function that processes a plant description into a structured dict using the system prompt provided.
-        The output is structured as follows:
-        {
-            'status': (parsing error type returned by LangChain. 'success' if parsing was successful),
-            'data': [
-                {'characteristic': (characteristic), 'value': (value)},
-                (...)
-            ] if parsing_error == None else None
-        }
+        Internal function for building the LangChain chain that processes a plant description into the Species schema using the system prompt provided.
+        The chain can be reused for every description processed with the same system prompt.
 
         Parameters:
-            desc (str): The species description to parse.
             sys_prompt (str): The system prompt to use.
-            show_log (bool): If true, print the run status.
 
         Returns:
-            chardict (dict): The output dictionary.
+            llm_chain (Runnable): The chain, which is invoked with {'description': description}
         """
 
         # Create prompt template
@@ -98,7 +99,27 @@ class LangChainCharProcessor:
         )
 
         # Create chain
-        llm_chain = prompt_template | self.llm.with_structured_output(schema = Species, include_raw = True)
+        return prompt_template | self.struct_llm
+
+    def response2charjson(self, response:Any, show_log:bool = False) -> dict:
+        """
+        Internal function that converts the response of a chain, or the exception thrown when invoking it, into a structured dict.
+        The output is structured as follows:
+        {
+            'status': (parsing error type returned by LangChain. 'success' if parsing was successful),
+            'data': [
+                {'characteristic': (characteristic), 'value': (value)},
+                (...)
+            ] if parsing_error == None else None
+        }
+
+        Parameters:
+            response (Any): The response returned by the chain, or the exception thrown.
+            show_log (bool): If true, print the run status.
+
+        Returns:
+            chardict (dict): The output dictionary.
+        """
 
         # Variable for storing output
         chardict = {
@@ -106,15 +127,12 @@ class LangChainCharProcessor:
             'data': None
         }
 
-        try: # Check for parsing error
-            # Invoke the prompt and get the response
-            response = llm_chain.invoke({'description': desc})
-        except Exception as err: # If parsing error occurs
+        if isinstance(response, Exception): # If parsing error occurs
             # Print status if show_log is true
             if show_log:
                 print('exception thrown! ', end = '', flush = True)
             # Get error string
-            err_str:str = err.args[0]
+            err_str:str = response.args[0]
             # Extract dict string from the error string
             err_dict_str = err_str[err_str.find('{') : err_str.rfind('}') + 1]
             # Parse error string
@@ -139,6 +157,69 @@ class LangChainCharProcessor:
 
         # Return the output dictionary
         return chardict
+
+    def chain2charjson(self, llm_chain:Runnable, desc:str, show_log:bool = False) -> dict:
+        """
+        Internal function that processes a plant description into a structured dict using a chain built by build_chain().
+        The output is structured in the same way as response2charjson().
+
+        Parameters:
+            llm_chain (Runnable): The chain to invoke.
+            desc (str): The species description to parse.
+            show_log (bool): If true, print the run status.
+
+        Returns:
+            chardict (dict): The output dictionary.
+        """
+
+        try: # Check for parsing error
+            # Invoke the prompt and get the response
+            response = llm_chain.invoke({'description': desc})
+        except Exception as err: # If parsing error occurs
+            response = err
+
+        # Return the output dictionary
+        return self.response2charjson(response, show_log)
+
+    async def chain2charjson_async(self, llm_chain:Runnable, desc:str) -> dict:
+        """
+        Asynchronous version of chain2charjson(), used for processing multiple descriptions concurrently.
+        The number of requests in flight is limited by the max_concurrency given at initialisation.
+
+        Parameters:
+            llm_chain (Runnable): The chain to invoke.
+            desc (str): The species description to parse.
+
+        Returns:
+            chardict (dict): The output dictionary.
+        """
+
+        try: # Check for parsing error
+            # Invoke the prompt and get the response once a slot is free
+            async with self.llm_semaphore:
+                response = await llm_chain.ainvoke({'description': desc})
+        except Exception as err: # If parsing error occurs
+            response = err
+
+        # Return the output dictionary
+        return self.response2charjson(response)
+
+    def desc2charjson(self, desc:str, sys_prompt:str, show_log:bool = False) -> dict:
+        """
+        Internal function that processes a plant description into a structured dict using the system prompt provided.
+        The output is structured in the same way as response2charjson().
+
+        Parameters:
+            desc (str): The species description to parse.
+            sys_prompt (str): The system prompt to use.
+            show_log (bool): If true, print the run status.
+
+        Returns:
+            chardict (dict): The output dictionary.
+        """
+
+        # Build the chain for the system prompt and invoke it
+        return self.chain2charjson(self.build_chain(sys_prompt), desc, show_log)
     
     def get_summary(self) -> dict:
         """
@@ -385,7 +466,8 @@ class LCTraitExtractor(LangChainCharProcessor):
                  ext_prompt:str,
                  ext_chars:List[str],
                  base_llm:str,
-                 llm_params:dict):
+                 llm_params:dict,
+                 max_concurrency:int = 4):
         """
         Initialise trait extractor.
 
@@ -394,14 +476,21 @@ class LCTraitExtractor(LangChainCharProcessor):
             ext_chars (List[str]): The list of characteristics to extract from the descriptions
             base_llm (str): Name of the base LLM to use
             llm_params (dict): Dictionary specifying model parameters as seen here: https://api.python.langchain.com/en/latest/chat_models/langchain_groq.chat_models.ChatGroq.html
+            max_concurrency (int): Maximum number of asynchronous requests sent to the LLM at once. Defaults to 4
         """
 
         # Run super initialiser
-        super().__init__(base_llm, llm_params)
+        super().__init__(base_llm, llm_params, max_concurrency)
 
         # Store parameters
         self.ext_prompt = ext_prompt
         self.ext_chars = ext_chars
+
+        # Insert characteristics into the prompt once, as they are the same for every species
+        self.ext_prompt_wchars = self.ext_prompt.replace('[CHARACTER_LIST]', '; '.join(self.ext_chars))
+
+        # Build the extraction chain once, as the prompt is the same for every species
+        self.ext_chain:Runnable = self.build_chain(self.ext_prompt_wchars)
     
     def ext_step(self, spid:str, desc:str, show_log:bool = False, store_results:bool = True) -> dict:
         """
@@ -435,22 +524,12 @@ class LCTraitExtractor(LangChainCharProcessor):
             print('trait extraction: processing... ', end = '', flush = True)
             start = time.time()
 
-        # Prepare prompt
-        prompt_wcontent = self.ext_prompt.replace('[CHARACTER_LIST]', '; '.join(self.ext_chars)) # Insert characteristics
-        
-        # Generate output
-        char_json = self.desc2charjson(desc, prompt_wcontent, show_log)
+        # Generate output using the prompt with the characteristics inserted
+        char_json = self.chain2charjson(self.ext_chain, desc, show_log)
 
         # If we need to store the outputs
         if store_results:
-            # Update sp_chars
-            self.sp_chars.append({
-                'coreid': spid,
-                'status': char_json['status'], # Status: one of 'success', 'bad_structure', 'invalid_json'
-                'original_description': desc,
-                'char_json': char_json['data'] if char_json['status'] == 'success' else None,
-                'failed_str': char_json['data'] if char_json['status'] != 'success' else None
-            })
+            self.store_charjson(spid, desc, char_json)
         
         # Status log
         if show_log:
@@ -460,6 +539,54 @@ class LCTraitExtractor(LangChainCharProcessor):
         # Return char_json
         return char_json
 
+    async def ext_step_async(self, spid:str, desc:str, store_results:bool = True) -> dict:
+        """
+        Asynchronous version of ext_step(), used for extracting the traits of multiple species concurrently.
+        The returned charjson is structured in the same way as ext_step().
+        NB: When the results are stored, they are stored in the order in which the runs finish.
+        To preserve the order of the species, set store_results to False and call store_charjson() in order.
+
+        Parameters:
+            spid (str): The WFO species id corresponding to the description
+            desc (str): The description to extract the characteristics from
+            store_results (bool): If this is True, store the extracted characteristics and values in the object. Default is True
+
+        Returns:
+            char_json (dict): The char_json produced from the given description
+        """
+
+        # Generate output using the prompt with the characteristics inserted
+        char_json = await self.chain2charjson_async(self.ext_chain, desc)
+
+        # If we need to store the outputs
+        if store_results:
+            self.store_charjson(spid, desc, char_json)
+
+        # Return extracted characteristics
+        return char_json
+
+    def store_charjson(self, spid:str, desc:str, char_json:dict) -> None:
+        """
+        Function for storing the char_json extracted from a species description in the object.
+
+        Parameters:
+            spid (str): The WFO species id corresponding to the description
+            desc (str): The description that the characteristics were extracted from
+            char_json (dict): The char_json produced from the description by ext_step() or ext_step_async()
+
+        Returns:
+            None
+        """
+
+        # Update sp_chars
+        self.sp_chars.append({
+            'coreid': spid,
+            'status': char_json['status'], # Status: one of 'success', 'bad_structure', 'invalid_json'
+            'original_description': desc,
+            'char_json': char_json['data'] if char_json['status'] == 'success' else None,
+            'failed_str': char_json['data'] if char_json['status'] != 'success' else None
+        })
+
     def get_summary(self) -> dict:
         """
         Function for getting the summary of the extraction run.
@@ -3,12 +3,18 @@ Script for defining the LLMCharProcessor class, which forms the basis of TraitAc
 """
 
 from typing import List, Dict, Optional, Any
-from collections.abc import Callable
-from ollama import Client
-import json
+from collections.abc import Callable, Iterator, AsyncIterator, Awaitable
+from ollama import Client, AsyncClient
+import asyncio
+import httpx
+import orjson
 import copy
+import re
+import hashlib
+import shelve
 
 from common_scripts import regularise
+from common_scripts.jsonscanner import JSONStreamScanner
 
 class LLMCharProcessor:
     """
@@ -22,44 +28,182 @@ class LLMCharProcessor:
     # Run mode name in the summary output; will never be used
     RUN_MODE_NAME = 'desc2json_primitive'
 
+    # Markers in the prompts that are replaced by their content, e.g. [DESCRIPTION]
+    PROMPT_MARKER_RE = re.compile(r'\[([A-Z_]+)\]')
+
+    # Runs of whitespace, which are collapsed in the cache keys
+    WHITESPACE_RE = re.compile(r'\s+')
+
     def __init__(self,
                  sys_prompt:str,
                  base_llm:str,
                  llm_params:dict,
-                 llm_name:str = 'desc2matrix',
-                 host_url:str = 'http://localhost:11434'):
+                 host_url:str = 'http://localhost:11434',
+                 max_concurrency:int = 4,
+                 cache_path:Optional[str] = None):
         """
         Initialise trait extractor.
 
         Parameters:
             sys_prompt (str): The system prompt to use
             base_llm (str): Name of the base LLM to use
-            llm_params (dict): Dictionary specifying model parameters as specified here: https://github.com/ollama/ollama/blob/main/docs/modelfile.md
-            llm_name (str): The name of the model to create. Defaults to 'desc2matrix'
+            llm_params (dict): Dictionary specifying model parameters as specified here: https://github.com/ollama/ollama/blob/main/docs/modelfile.md. Parameters set to None are left to the Ollama defaults
             host_url (str): The Ollama host url to use. Defaults to 'http://localhost:11434'
+            max_concurrency (int): Maximum number of asynchronous requests sent to the Ollama server at once. This should match OLLAMA_NUM_PARALLEL on the server. Defaults to 4
+            cache_path (Optional[str]): Path of the shelve file used to cache the LLM responses across runs. Responses are not cached if this is None. Defaults to None
         """
 
         # Save the parameters
         self.sys_prompt:str = sys_prompt
         self.base_llm:str = base_llm
         self.llm_params:dict = llm_params
-        self.llm_name:str = llm_name
 
-        # Build Ollama modelfile
-        modelfile = '{}\n{}'.format(
-            'FROM {}'.format(self.base_llm),
-            '\n'.join(['PARAMETER {} {}'.format(param, value) for param, value in self.llm_params.items() if value != None])
-        )
+        # Build the Ollama options passed with every request, leaving out unset parameters
+        # Passing these inline instead of creating a derived model keeps Ollama working with the base model
+        self.llm_options:dict = {param: value for param, value in self.llm_params.items() if value != None}
 
         # Make connection to client and store Ollama client
         self.client:Client = Client(host = host_url, timeout = self.LLM_TIMEOUT)
 
-        # Create model with the specified params
-        self.client.create(model = self.llm_name, modelfile = modelfile)
+        # Asynchronous Ollama client, used for processing multiple descriptions concurrently
+        # The connection pool is sized so that every concurrent request reuses a kept-alive connection
+        self.async_client:AsyncClient = AsyncClient(host = host_url, timeout = self.LLM_TIMEOUT,
+                                                    limits = httpx.Limits(max_connections = max_concurrency, max_keepalive_connections = max_concurrency))
+
+        # Semaphore limiting the number of asynchronous requests in flight
+        # Requests beyond this limit wait here instead of queueing on the Ollama server
+        self.llm_semaphore:asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Persistent cache of LLM responses, keyed by a hash of the model, parameters and prompt
+        self.cache:Optional[shelve.Shelf] = shelve.open(cache_path) if cache_path != None else None
+
+        # Modelfile of the base LLM, which names the blob holding the model weights
+        # This is part of the cache key so that cached responses are not reused once the model is re-pulled or recreated under the same tag
+        self.base_modelfile:Optional[str] = self.client.show(self.base_llm)['modelfile'] if self.cache != None else None
+
+        # Asynchronous LLM requests sent in this run, keyed by cache key, so that identical requests share a single LLM call
+        self.llm_tasks:Dict[str, asyncio.Task] = {}
 
         # Variable to store the extracted characteristics data
         self.sp_chars:List[dict] = []
 
+    def close(self) -> None:
+        """
+        Function for closing the response cache, if any, so that the cached responses are written to disk.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+
+        if self.cache != None:
+            self.cache.close()
+            self.cache = None
+
+    def get_cache_key(self, request:Any, output_schema:Optional[dict] = None, options:Optional[dict] = None) -> str:
+        """
+        Internal function used to build the cache key for an LLM request.
+        The key is a hash of everything that affects the response: the base LLM and its modelfile, the Ollama options sent, the system prompt, the output format, and the prompt or messages.
+        The key is built from the options sent with the request with sorted keys, so that the same effective request gets the same key whichever way its options were built.
+        Whitespace in the prompt or messages is collapsed, so that descriptions that only differ in spacing / line breaks share a key.
+
+        Parameters:
+            request (Any): The fully constructed prompt string or list of messages sent to the LLM
+            output_schema (Optional[dict]): The JSON schema passed to Ollama as the output format, if any
+            options (Optional[dict]): The Ollama options passed with the request, if different from those built from llm_params (i.e. llm_options)
+
+        Returns:
+            cache_key (str): Hex digest identifying the request
+        """
+
+        # Collapse whitespace in the prompt string or message contents
+        if isinstance(request, str):
+            request = self.WHITESPACE_RE.sub(' ', request).strip()
+        else:
+            request = [{**message, 'content': self.WHITESPACE_RE.sub(' ', message['content']).strip()} for message in request]
+
+        # Options sent with the request
+        sent_options = self.llm_options if options == None else options
+
+        return hashlib.blake2b(orjson.dumps([self.base_llm, self.base_modelfile, sent_options, self.sys_prompt, output_schema, request],
+                                            option = orjson.OPT_SORT_KEYS)).hexdigest()
+
+    def get_cached_response(self, cache_key:str) -> Optional[str]:
+        """
+        Internal function used to retrieve a cached LLM response.
+
+        Parameters:
+            cache_key (str): The key returned by get_cache_key()
+
+        Returns:
+            resp (Optional[str]): The cached response string, or None if there is no cache or the request has not been cached
+        """
+
+        if self.cache == None:
+            return None
+        return self.cache.get(cache_key)
+
+    def store_cached_response(self, cache_key:str, resp:str) -> None:
+        """
+        Internal function used to store an LLM response in the cache, if there is one.
+        The raw response is stored rather than the parsed output so that changes to parsing / regularisation apply to cached responses.
+
+        Parameters:
+            cache_key (str): The key returned by get_cache_key()
+            resp (str): The LLM response string
+
+        Returns:
+            None
+        """
+
+        if self.cache != None:
+            self.cache[cache_key] = resp
+
+    async def get_response_async(self, cache_key:str, request_llm:Callable[[], Awaitable[str]]) -> str:
+        """
+        Internal function used to get the response to an asynchronous LLM request.
+        The cached response is used if there is one. Otherwise, the LLM is only called once for each cache key in a run;
+        identical requests, e.g. for duplicate descriptions, wait for the response of the first one, even if it is still being generated.
+
+        Parameters:
+            cache_key (str): The key returned by get_cache_key()
+            request_llm (Callable[[], Awaitable[str]]): Function sending the request to the LLM and returning the response string
+
+        Returns:
+            resp (str): The LLM response string
+        """
+
+        # Reuse the cached response if the same request has been run before
+        resp = self.get_cached_response(cache_key)
+        if resp != None:
+            return resp
+
+        # Share the LLM call with any identical request in this run
+        if cache_key not in self.llm_tasks:
+            self.llm_tasks[cache_key] = asyncio.create_task(request_llm())
+        resp = await self.llm_tasks[cache_key]
+        self.store_cached_response(cache_key, resp)
+
+        return resp
+
+    def fill_prompt(self, prompt:str, markers:Dict[str, str]) -> str:
+        """
+        Internal function used to insert content into the markers of a prompt, e.g. [DESCRIPTION], in a single pass over the prompt.
+        Markers that are not in the markers dict are left as they are.
+        NB: str.format() cannot be used for this as the prompts contain curly brackets in the example JSON.
+
+        Parameters:
+            prompt (str): The prompt containing the markers
+            markers (Dict[str, str]): Dictionary mapping the marker names without brackets (e.g. 'DESCRIPTION') to their content
+
+        Returns:
+            prompt_wcontent (str): The prompt with the content inserted
+        """
+
+        return self.PROMPT_MARKER_RE.sub(lambda match: markers.get(match.group(1), match.group(0)), prompt)
+
     def parse_llm_response(self, resp:str, regulariser:Callable[[Any], Optional[Any]]) -> dict:
         """
         Internal function used to parse the LLM response into charjson.
@@ -83,14 +227,14 @@ class LLMCharProcessor:
         # Attempt to parse prompt as JSON
         char_json = {} # Output JSON
         try:
-            resp_json = json.loads(resp) # Parse output as JSON
+            resp_json = orjson.loads(resp) # Parse output as JSON
             # Check validity / regularise output
             reg_resp_json = regulariser(resp_json)
             if reg_resp_json != None:
                 char_json = {'status': 'success', 'data': reg_resp_json} # Save parsed JSON with status
             else:
                 char_json = {'status': 'bad_structure', 'data': str(resp_json)} # Save string with status
-        except json.decoder.JSONDecodeError as decode_err: # If LLM returns bad string
+        except orjson.JSONDecodeError as decode_err: # If LLM returns bad string
             char_json = {'status': 'invalid_json', 'data': resp} # Save string with status
         
         # Return result
@@ -115,7 +259,48 @@ class LLMCharProcessor:
         if status == 'success': # If run succeeded
             print('ollama output successfully parsed! ', end = end, flush = True)
 
-    def prompt2charjson(self, prompt:str, regulariser:Callable[[Any], Optional[Any]] = regularise.regularise_charjson, show_log:bool = False) -> dict:
+    def read_stream(self, stream:Iterator[Any], get_content:Callable[[Any], str]) -> str:
+        """
+        Internal function used to read a streamed LLM response, stopping as soon as the JSON in the response is complete
+        or as soon as it is clear that the response is not JSON. Closing the stream early stops the generation on the Ollama server.
+
+        Parameters:
+            stream (Iterator[Any]): The stream returned by Client.generate() or Client.chat() with stream = True
+            get_content (Callable[[Any], str]): Function returning the text content of a streamed part
+
+        Returns:
+            resp (str): The response string, cut off at the end of the JSON
+        """
+
+        scanner = JSONStreamScanner()
+        for part in stream:
+            if scanner.feed(get_content(part)):
+                break
+        stream.close()
+
+        return scanner.text
+
+    async def read_stream_async(self, stream:AsyncIterator[Any], get_content:Callable[[Any], str]) -> str:
+        """
+        Asynchronous version of read_stream(), used with the streams returned by AsyncClient.
+
+        Parameters:
+            stream (AsyncIterator[Any]): The stream returned by AsyncClient.generate() or AsyncClient.chat() with stream = True
+            get_content (Callable[[Any], str]): Function returning the text content of a streamed part
+
+        Returns:
+            resp (str): The response string, cut off at the end of the JSON
+        """
+
+        scanner = JSONStreamScanner()
+        async for part in stream:
+            if scanner.feed(get_content(part)):
+                break
+        await stream.aclose()
+
+        return scanner.text
+
+    def prompt2charjson(self, prompt:str, regulariser:Callable[[Any], Optional[Any]] = regularise.regularise_charjson, output_schema:Optional[dict] = regularise.CHARJSON_SCHEMA, options:Optional[dict] = None, show_log:bool = False) -> dict:
         """
         Internal function used for extracting charjson with a fully-constructed prompt string.
         The output is structured as follows:
@@ -130,15 +315,26 @@ class LLMCharProcessor:
         Parameters:
             prompt (str): The fully constructed prompt string, with descriptions / character lists filled in
             regulariser (Callable[[Any], Optional[Any]]): Regulariser / validator function that returns either a regularised charjson or None if the JSON has bad structure. E.g. regularise.regularise_charjson().
+            output_schema (Optional[dict]): JSON schema passed to Ollama as the output format, constraining the LLM to generate JSON with the structure expected by the regulariser. No constraint is applied if this is None. Default is regularise.CHARJSON_SCHEMA.
+            options (Optional[dict]): Ollama options to use for this prompt only, e.g. with a different num_predict. The options built from llm_params are used if this is None. Default is None.
             show_log (bool): If this is set to True, the function will output a log showing parse status. Default is False.
 
         Returns:
             char_json (dict): The output dict
         """
 
-        resp = self.client.generate(model = self.llm_name,
-                                    prompt = prompt,
-                                    system = self.sys_prompt)['response']
+        # Reuse the cached response if the same prompt has been run before
+        cache_key = self.get_cache_key(prompt, output_schema, options)
+        resp = self.get_cached_response(cache_key)
+        if resp == None:
+            stream = self.client.generate(model = self.base_llm,
+                                          prompt = prompt,
+                                          system = self.sys_prompt,
+                                          options = self.llm_options if options == None else options,
+                                          format = output_schema,
+                                          stream = True)
+            resp = self.read_stream(stream, lambda part: part['response'])
+            self.store_cached_response(cache_key, resp)
 
         # Attempt to parse prompt as JSON
         char_json = self.parse_llm_response(resp, regulariser)
@@ -149,8 +345,44 @@ class LLMCharProcessor:
         
         # Return output JSON
         return char_json
+
+    async def prompt2charjson_async(self, prompt:str, regulariser:Callable[[Any], Optional[Any]] = regularise.regularise_charjson, output_schema:Optional[dict] = regularise.CHARJSON_SCHEMA, options:Optional[dict] = None) -> dict:
+        """
+        Asynchronous version of prompt2charjson(), used for sending multiple prompts to the Ollama server concurrently.
+        The output is structured in the same way as prompt2charjson().
+        At most max_concurrency prompts are processed at once; the rest wait for a free slot.
+        No status log is shown as the outputs of concurrent runs would be interleaved.
+
+        Parameters:
+            prompt (str): The fully constructed prompt string, with descriptions / character lists filled in
+            regulariser (Callable[[Any], Optional[Any]]): Regulariser / validator function that returns either a regularised charjson or None if the JSON has bad structure. E.g. regularise.regularise_charjson().
+            output_schema (Optional[dict]): JSON schema passed to Ollama as the output format, constraining the LLM to generate JSON with the structure expected by the regulariser. No constraint is applied if this is None. Default is regularise.CHARJSON_SCHEMA.
+            options (Optional[dict]): Ollama options to use for this prompt only, e.g. with a different num_predict. The options built from llm_params are used if this is None. Default is None.
+
+        Returns:
+            char_json (dict): The output dict
+        """
+
+        async def request_llm() -> str:
+            async with self.llm_semaphore:
+                stream = await self.async_client.generate(model = self.base_llm,
+                                                          prompt = prompt,
+                                                          system = self.sys_prompt,
+                                                          options = self.llm_options if options == None else options,
+                                                          format = output_schema,
+                                                          stream = True)
+                return await self.read_stream_async(stream, lambda part: part['response'])
+
+        # Get the response, reusing the cached or in-flight response if the same prompt has been run before
+        resp = await self.get_response_async(self.get_cache_key(prompt, output_schema, options), request_llm)
+
+        # Attempt to parse prompt as JSON
+        char_json = self.parse_llm_response(resp, regulariser)
+
+        # Return output JSON
+        return char_json
     
-    def messages2charjson(self, messages:List[Dict[str,str]], regulariser:Callable[[Any], Optional[Any]] = regularise.regularise_charjson, show_log:bool = False) -> dict:
+    def messages2charjson(self, messages:List[Dict[str,str]], regulariser:Callable[[Any], Optional[Any]] = regularise.regularise_charjson, output_schema:Optional[dict] = regularise.CHARJSON_SCHEMA, show_log:bool = False) -> dict:
         """
         Internal function used for extracting charjson with fully-constructed messages including the species descriptions, etc.
         The input message must be structured as follows, as used in the ollama.chat function (https://github.com/ollama/ollama-python):
@@ -162,14 +394,20 @@ class LLMCharProcessor:
         Parameters:
             messages (List[Dict[str,str]]): Fully constructed list of messages, with descriptions / character lists filled in
             regulariser (Callable[[Any], Optional[Any]]): Regulariser / validator function that returns either a regularised charjson or None if the JSON has bad structure. E.g. regularise.regularise_charjson().
+            output_schema (Optional[dict]): JSON schema passed to Ollama as the output format, constraining the LLM to generate JSON with the structure expected by the regulariser. No constraint is applied if this is None. Default is regularise.CHARJSON_SCHEMA.
             show_log (bool): If this is set to True, the function will output a log showing task completion and elapsed time. Default is False.
 
         Returns:
             char_json (dict): The output containing the status code (['status'] = 'success' | 'bad_structure' | 'invalid_json') and the extracted characteristics(['data'])
         """
         
-        # Generate response message
-        resp = self.client.chat(model = self.llm_name, stream = False, messages = messages)['message']['content']
+        # Generate response message, reusing the cached response if the same messages have been run before
+        cache_key = self.get_cache_key(messages, output_schema)
+        resp = self.get_cached_response(cache_key)
+        if resp == None:
+            stream = self.client.chat(model = self.base_llm, stream = True, messages = messages, options = self.llm_options, format = output_schema)
+            resp = self.read_stream(stream, lambda part: part['message']['content'])
+            self.store_cached_response(cache_key, resp)
 
         # Attempt to parse prompt as JSON
         char_json = self.parse_llm_response(resp, regulariser)
@@ -181,6 +419,36 @@ class LLMCharProcessor:
         # Return output JSON
         return char_json
     
+    async def messages2charjson_async(self, messages:List[Dict[str,str]], regulariser:Callable[[Any], Optional[Any]] = regularise.regularise_charjson, output_schema:Optional[dict] = regularise.CHARJSON_SCHEMA) -> dict:
+        """
+        Asynchronous version of messages2charjson(), used for sending multiple chats to the Ollama server concurrently.
+        The output is structured in the same way as messages2charjson().
+        At most max_concurrency requests are processed at once; the rest wait for a free slot.
+        No status log is shown as the outputs of concurrent runs would be interleaved.
+
+        Parameters:
+            messages (List[Dict[str,str]]): Fully constructed list of messages, with descriptions / character lists filled in
+            regulariser (Callable[[Any], Optional[Any]]): Regulariser / validator function that returns either a regularised charjson or None if the JSON has bad structure. E.g. regularise.regularise_charjson().
+            output_schema (Optional[dict]): JSON schema passed to Ollama as the output format, constraining the LLM to generate JSON with the structure expected by the regulariser. No constraint is applied if this is None. Default is regularise.CHARJSON_SCHEMA.
+
+        Returns:
+            char_json (dict): The output dict
+        """
+
+        async def request_llm() -> str:
+            async with self.llm_semaphore:
+                stream = await self.async_client.chat(model = self.base_llm, stream = True, messages = messages, options = self.llm_options, format = output_schema)
+                return await self.read_stream_async(stream, lambda part: part['message']['content'])
+
+        # Generate response message, reusing the cached or in-flight response if the same messages have been run before
+        resp = await self.get_response_async(self.get_cache_key(messages, output_schema), request_llm)
+
+        # Attempt to parse prompt as JSON
+        char_json = self.parse_llm_response(resp, regulariser)
+
+        # Return output JSON
+        return char_json
+
     def get_summary(self) -> dict:
         """
         Function for getting the summary of the LLM run outputs.
@@ -1,9 +1,131 @@
-from typing import List, Optional
+from typing import List, Optional, Callable, Any
+from collections.abc import Iterator
 from ollama import Client
 import time
 import json
+import orjson
+import re
+import shelve
+import hashlib
 
 from common_scripts import regularise, process_words
+from common_scripts.jsonscanner import JSONStreamScanner
+
+# Single quotes used as JSON string delimiters, i.e. not between two letters as in "leaf's"
+DELIM_QUOTE_RE = re.compile(r"(?<![A-Za-z])'|'(?![A-Za-z])")
+
+def read_stream(stream:Iterator[Any], get_content:Callable[[Any], str]) -> str:
+    """
+    Reads a streamed LLM response, stopping as soon as the top-level JSON value in the response is complete
+    or no JSON has started within the first chunks of the response, so that the LLM does not keep generating text that would be discarded.
+
+    Parameters:
+        stream (Iterator[Any]): The stream returned by Client.generate() or Client.chat() with stream = True
+        get_content (Callable[[Any], str]): Function returning the text content of a streamed part
+
+    Returns:
+        resp (str): The response string, cut off at the end of the JSON
+    """
+
+    scanner = JSONStreamScanner()
+    for part in stream:
+        if scanner.feed(get_content(part)):
+            break
+    stream.close() # Closing the stream ends the request, which stops the generation on the Ollama server
+
+    return scanner.text
+
+# Key in the response cache under which the modelfiles used to generate the cached responses are stored
+CACHE_MODELFILE_KEY = 'modelfile'
+
+def open_cache(cache_path:str, modelfile:str, base_modelfile:str) -> shelve.Shelf:
+    """
+    Opens the shelve file used to cache the LLM responses across runs.
+    The cache is cleared if its responses were generated with a different modelfile, since the responses depend on the model parameters,
+    or with a different base model modelfile, which changes when the base model is re-pulled or recreated under the same name.
+
+    Parameters:
+        cache_path (str): Path of the shelve file
+        modelfile (str): The modelfile used to create the model for this run
+        base_modelfile (str): The modelfile of the base model as returned by Client.show(), which names the blob holding the model weights
+
+    Returns:
+        cache (shelve.Shelf): The response cache
+    """
+
+    cache = shelve.open(cache_path)
+    if cache.get(CACHE_MODELFILE_KEY) != [modelfile, base_modelfile]:
+        cache.clear()
+        cache[CACHE_MODELFILE_KEY] = [modelfile, base_modelfile]
+
+    return cache
+
+def get_cached_resp(request:Any, request_llm:Callable[[], str], cache:Optional[shelve.Shelf] = None) -> str:
+    """
+    Returns the cached response to an LLM request if there is one, and otherwise sends the request and caches the response.
+
+    Parameters:
+        request (Any): JSON-serialisable list of everything that determines the response, e.g. [model, system prompt, prompt]; this is hashed into the cache key
+        request_llm (Callable[[], str]): Function sending the request to the LLM and returning the response string
+        cache (Optional[shelve.Shelf]): The response cache opened with open_cache(). The request is always sent if this is None. Default is None.
+
+    Returns:
+        resp (str): The response string
+    """
+
+    if cache == None:
+        return request_llm()
+
+    cache_key = hashlib.blake2b(orjson.dumps(request)).hexdigest()
+    if cache_key in cache: # Same request was made before
+        return cache[cache_key]
+
+    resp = request_llm()
+    cache[cache_key] = resp
+
+    return resp
+
+def parse_resp(resp:str,
+               regulariser:Callable[[Any], Optional[Any]],
+               silent:bool = False,
+               status_suffix:str = '') -> dict:
+    """
+    Parses the LLM response into a dict containing the status code and the regularised output, shared by all the functions in this file.
+    The resulting dict is structured as follows:
+    {
+        'status': 'success' | 'bad_structure' | 'invalid_json' (followed by status_suffix if the run failed),
+        'data': (regularised output) IF STATUS IS SUCCESS ELSE (string that failed to parse)
+    }
+
+    Parameters:
+        resp (str): The LLM response string.
+        regulariser (Callable[[Any], Optional[Any]]): Regulariser / validator function that returns either the regularised output or None if the JSON has bad structure, e.g. regularise.regularise_charjson.
+        silent (bool): If this is set to False, the function will output a log when the response fails to parse. Default is False.
+        status_suffix (str): String appended to the status code when the response fails to parse, e.g. '_followup'. Default is ''.
+
+    Returns:
+        parsed_resp (dict): The output dict
+    """
+
+    # Attempt to parse response as JSON
+    try:
+        resp_json = orjson.loads(resp)
+    except orjson.JSONDecodeError: # Response may use ' as string delimiters
+        try:
+            resp_json = orjson.loads(DELIM_QUOTE_RE.sub('"', resp)) # Replace ' used as delimiters with "
+        except orjson.JSONDecodeError as decode_err: # If LLM returns bad string
+            if not silent:
+                print('ollama returned bad JSON string... ', end = '', flush = True)
+            return {'status': 'invalid_json' + status_suffix, 'data': resp} # Save string with status
+
+    # Check validity / regularise output
+    reg_resp_json = regulariser(resp_json)
+    if reg_resp_json == None:
+        if not silent:
+            print('ollama output is JSON but is structured badly... ', end = '', flush = True)
+        return {'status': 'bad_structure' + status_suffix, 'data': str(resp_json)} # Save string with status
+
+    return {'status': 'success', 'data': reg_resp_json} # Save parsed JSON with status
 
 def desc2charjson(sys_prompt:str,
                   prompt:str,
@@ -11,10 +133,12 @@ def desc2charjson(sys_prompt:str,
                   client:Client,
                   chars:Optional[List[str]] = None,
                   model:str = 'desc2matrix',
-                  silent:bool = False) -> dict:
+                  silent:bool = False,
+                  cache:Optional[shelve.Shelf] = None) -> dict:
     """
     Converts a single species description to a structured dict, given the appropriate prompts and the Ollama client.
     Optionally, 'chars' parameter can be used to specify a list of characteristics to extract.
+    When the same list is used for many species, it is quicker to fill '[CHARACTER_LIST]' in the prompts once and leave 'chars' as None.
     The resulting dict is structured as follows:
     {
         'status': 'success' | 'bad_structure' | 'invalid_json',
@@ -28,6 +152,7 @@ def desc2charjson(sys_prompt:str,
         client (Client): The Ollama Client to use for running the LLM.
         model (str): The name of the LLM to use. Default is 'desc2matrix' which is created by desc2matrix_*.py.
         silent (bool): If this is set to False, the function will output a log showing task completion and elapsed time. Default is False.
+        cache (Optional[shelve.Shelf]): The response cache opened with open_cache(). Responses are not cached if this is None. Default is None.
 
     Returns:
         char_json (dict): The output containing the status code (['status'] = 'success' | 'bad_structure' | 'invalid_json') and the extracted characteristics(['data'])
@@ -45,25 +170,14 @@ def desc2charjson(sys_prompt:str,
     prompt_wcontent = prompt.replace('[DESCRIPTION]', desc)
     if chars != None: # Insert characteristics list if specified
         prompt_wcontent = prompt_wcontent.replace('[CHARACTER_LIST]', '; '.join(chars))
-    resp = client.generate(model = model,
-                                prompt = prompt_wcontent,
-                                system = sys_prompt)['response']
+    resp = get_cached_resp([model, sys_prompt, prompt_wcontent],
+                           lambda: read_stream(client.generate(model = model,
+                                                               prompt = prompt_wcontent,
+                                                               system = sys_prompt,
+                                                               stream = True), lambda part: part['response']), cache)
 
-    # Attempt to parse prompt as JSON
-    try:
-        resp_json = json.loads(resp.replace("'", '"')) # Replace ' with "
-        # Check validity / regularise output
-        reg_resp_json = regularise.regularise_charjson(resp_json)
-        if reg_resp_json != None:
-            char_json = {'status': 'success', 'data': reg_resp_json} # Save parsed JSON with status
-        else:
-            if not silent:
-                print('ollama output is JSON but is structured badly... ', end = '', flush = True)
-            char_json = {'status': 'bad_structure', 'data': str(resp_json)} # Save string with status
-    except json.decoder.JSONDecodeError as decode_err: # If LLM returns bad string
-        if not silent:
-            print('ollama returned bad JSON string... ', end = '', flush = True)
-        char_json = {'status': 'invalid_json', 'data': resp} # Save string with status
+    # Attempt to parse response as JSON
+    char_json = parse_resp(resp, regularise.regularise_charjson, silent)
     
     if not silent:
         elapsed_t = time.time() - start
@@ -79,11 +193,13 @@ def desc2charjson_followup(sys_prompt:str,
                            client:Client,
                            chars:Optional[List[str]] = None,
                            model = 'desc2matrix',
-                           silent = False):
+                           silent = False,
+                           cache:Optional[shelve.Shelf] = None):
     """
     Converts a single species description to a structured dict, given the appropriate prompts, a list of characteristics to extract, and and the Ollama client.
-    This function is different from desc2charjson_wchars in that it asks the LLM a 'follow-up' question including the omitted words to recover more characteristics.
+    This function is different from desc2charjson in that it asks the LLM a 'follow-up' question including the omitted words to recover more characteristics.
     Optionally, 'chars' parameter may be used to provide a list of characteristics to extract.
+    When the same list is used for many species, it is quicker to fill '[CHARACTER_LIST]' in the prompts once and leave 'chars' as None.
     The resulting dict is structured as follows:
     {
         'status': 'success' | 'bad_structure' | 'invalid_json' | 'bad_structure_followup' | 'invalid_json_followup',
@@ -97,6 +213,7 @@ def desc2charjson_followup(sys_prompt:str,
         client (Client): The Ollama Client to use for running the LLM.
         model (str): The name of the LLM to use. Default is 'desc2matrix' which is created by desc2matrix_*.py.
         silent (bool): If this is set to False, the function will output a log showing task completion and elapsed time. Default is False.
+        cache (Optional[shelve.Shelf]): The response cache opened with open_cache(). Responses are not cached if this is None. Default is None.
 
     Returns:
         char_json (dict): The output dict
@@ -109,7 +226,7 @@ def desc2charjson_followup(sys_prompt:str,
     init_raw_char_json = None
 
     # Generate initial response using desc2charjson_single
-    init_raw_char_json = desc2charjson(sys_prompt, prompt, desc, client, chars, model, silent)
+    init_raw_char_json = desc2charjson(sys_prompt, prompt, desc, client, chars, model, silent, cache)
 
     # Skip if JSON output was invalid or badly structured
     if(init_raw_char_json['status'] != 'success'):
@@ -128,32 +245,32 @@ def desc2charjson_followup(sys_prompt:str,
     # Retrieve omissions
     omissions = process_words.get_omissions(desc, init_char_json)
 
+    # Skip the follow-up question if no words were omitted
+    if len(omissions) == 0:
+        if not silent:
+            print('no omitted words, skipped!')
+        return init_raw_char_json
+
     # Build the follow-up prompt
-    followup_prompt = f_prompt.replace('[DESCRIPTION]', desc).replace('[MISSING_WORDS]', '; '.join(sorted(omissions))).replace('[CHARACTER_LIST]', '; '.join(chars))
+    followup_prompt = f_prompt.replace('[DESCRIPTION]', desc).replace('[MISSING_WORDS]', '; '.join(sorted(omissions)))
+    if chars != None: # Insert characteristics list if specified
+        followup_prompt = followup_prompt.replace('[CHARACTER_LIST]', '; '.join(chars))
 
-    # Generate response using the follow-up prompt
-    followup_resp = client.chat(model = model, stream = False, messages = [
+    # Build the follow-up conversation
+    messages = [
         {'role': 'system', 'content': sys_prompt}, 
         {'role': 'user', 'content': prompt.replace('[DESCRIPTION]', desc)},
         {'role': 'assistant', 'content': json.dumps(init_char_json, indent=4)},
         {'role': 'user', 'content': followup_prompt}
-    ])['message']['content']
+    ]
 
-    # Attempt to parse prompt as JSON
-    try:
-        resp_json = json.loads(followup_resp.replace("'", '"')) # Replace ' with "
-        # Check validity / regularise output
-        reg_resp_json = regularise.regularise_charjson(resp_json)
-        if reg_resp_json != False:
-            char_json = {'status': 'success', 'data': reg_resp_json} # Save parsed JSON with status
-        else:
-            if not silent:
-                print('ollama output is JSON but is structured badly... ', end = '', flush = True)
-            char_json = {'status': 'bad_structure_followup', 'data': str(resp_json)} # Save string with status; 'followup' to distinguish it from failure in the first run
-    except json.decoder.JSONDecodeError as decode_err: # If LLM returns bad string
-        if not silent:
-            print('ollama returned bad JSON string... ', end = '', flush = True)
-        char_json = {'status': 'invalid_json_followup', 'data': followup_resp} # Save string with status
+    # Generate response using the follow-up prompt
+    followup_resp = get_cached_resp([model, messages],
+                                    lambda: read_stream(client.chat(model = model, stream = True, messages = messages),
+                                                        lambda part: part['message']['content']), cache)
+
+    # Attempt to parse response as JSON; '_followup' to distinguish failure from failure in the first run
+    char_json = parse_resp(followup_resp, regularise.regularise_charjson, silent, status_suffix = '_followup')
 
     # Progress log
     if not silent:
@@ -169,7 +286,8 @@ def get_char_table(sys_prompt:str,
                    descs:List[str],
                    client:Client,
                    model:str = 'desc2matrix',
-                   silent:str = False) -> dict:
+                   silent:str = False,
+                   cache:Optional[shelve.Shelf] = None) -> dict:
     """
     Generate a structured 'table' of traits from the given spcies descriptions.
     The output dict is structured as follows:
@@ -189,6 +307,7 @@ def get_char_table(sys_prompt:str,
         client (Client): The Ollama Client to use for running the LLM.
         model (str): The name of the LLM to use. Default is 'desc2matrix' which is created by desc2matrix_*.py.
         silent (bool): If this is set to False, the function will output a log showing task completion and elapsed time. Default is False.
+        cache (Optional[shelve.Shelf]): The response cache opened with open_cache(). Responses are not cached if this is None. Default is None.
     
     Returns:
         char_json (dict): The output dict
@@ -207,25 +326,15 @@ def get_char_table(sys_prompt:str,
     desc_str = '\n\n'.join(['Species ID: {}\n\nSpecies description:\n{}'.format(spid, desc) for spid, desc in zip(spids, descs)])
 
     # Generate response while specifying system prompt
-    resp = client.generate(model = model,
-                                prompt = prompt.replace('[DESCRIPTIONS]', desc_str),
-                                system = sys_prompt)['response']
+    prompt_wcontent = prompt.replace('[DESCRIPTIONS]', desc_str)
+    resp = get_cached_resp([model, sys_prompt, prompt_wcontent],
+                           lambda: read_stream(client.generate(model = model,
+                                                               prompt = prompt_wcontent,
+                                                               system = sys_prompt,
+                                                               stream = True), lambda part: part['response']), cache)
     
-    # Attempt to parse to JSON
-    try:
-        resp_json = json.loads(resp.replace("'", '"')) # Replace ' with "
-        # Check validity / regularise output
-        reg_resp_json = regularise.regularise_table(resp_json, spids)
-        if reg_resp_json != None:
-            tab_json = {'status': 'success', 'data': reg_resp_json} # Save parsed JSON with status
-        else:
-            if not silent:
-                print('ollama output is JSON but is structured badly... ', end = '', flush = True)
-            tab_json = {'status': 'bad_structure', 'data': str(resp_json)} # Save string with status
-    except json.decoder.JSONDecodeError as decode_err: # If LLM returns bad string
-        if not silent:
-            print('ollama returned bad JSON string... ', end = '', flush = True)
-        tab_json = {'status': 'invalid_json', 'data': resp} # Save string with status
+    # Attempt to parse response as JSON
+    tab_json = parse_resp(resp, lambda resp_json: regularise.regularise_table(resp_json, spids), silent)
 
     # Elapsed time log
     if not silent:
@@ -2,16 +2,98 @@ from typing import Set, List
 import nltk
 import re
 import inflect
-
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('averaged_perceptron_tagger')
+import functools
+
+# NLTK data used by this script, as (resource path, package name)
+NLTK_RESOURCES = [
+    ('corpora/stopwords', 'stopwords'),
+    ('taggers/averaged_perceptron_tagger', 'averaged_perceptron_tagger')
+]
+
+# Only download NLTK data that isn't installed yet, so that importing this script doesn't contact the NLTK server every time
+for resource_path, package in NLTK_RESOURCES:
+    try:
+        nltk.data.find(resource_path)
+    except LookupError:
+        nltk.download(package)
 from nltk.corpus import stopwords
 
 inf = inflect.engine()
 # Turn on 'classical' plurals as they are likely to occur in the dataset
 inf.classical()
 
+# Regex for the substitutions made to the description string in get_word_set(), matched in a single pass; see desc_sub()
+DESC_SUB_RE = re.compile(
+    r'(?P<period>[^0-9] *\. *[^0-9]|[^0-9] *\. *[0-9]|[0-9] *\. *[^0-9])' # Periods, except for those in floating-point numbers
+    r'|(?P<bracket>[,:;\(\)\[\]{}"\'`“”])' # Brackets, etc.
+    r'|(?P<range>(?P<range_min>[0-9]) *- *(?P<range_max>[0-9]))' # Numeric ranges
+)
+
+def desc_sub(match:re.Match) -> str:
+    """
+    Get the replacement for a match of DESC_SUB_RE.
+
+    Parameters:
+        match (re.Match): Match of DESC_SUB_RE
+
+    Returns:
+        repl (str): The replacement string
+    """
+
+    if match.group('period') != None: # Insert whitespace after period
+        return '. '
+    if match.group('bracket') != None: # Replace brackets, etc. with space
+        return ' '
+    # Collapse numeric ranges to single 'word' to check for presence
+    return match.group('range_min') + '-' + match.group('range_max')
+
+# Regex for tokenising the description string in get_word_set(); periods are only kept inside floating-point numbers
+TOKEN_RE = re.compile(r'(?:[^\s.]|(?<=[0-9])\.(?=[0-9]))+')
+
+# Part-of-speech tags given to nouns by the NLTK tagger
+NOUN_TAGS = frozenset(['NN', 'NNS', 'NNPS', 'NNP'])
+
+@functools.lru_cache(maxsize = None)
+def is_noun(word:str) -> bool:
+    """
+    Check whether a word is tagged as a noun by the NLTK part-of-speech tagger.
+    The word is tagged on its own, so the result only depends on the word and is cached across descriptions.
+
+    Parameters:
+        word (str): The word to check
+
+    Returns:
+        noun (bool): True if the word is tagged as a noun
+    """
+
+    return nltk.pos_tag([word])[0][1] in NOUN_TAGS
+
+@functools.lru_cache(maxsize = None)
+def get_stop_words() -> frozenset:
+    """
+    Get the set of English stop words. The stop words are loaded from the NLTK data on the first call only.
+
+    Returns:
+        stop_words (frozenset): The set of stop words
+    """
+
+    return frozenset(stopwords.words('english'))
+
+@functools.lru_cache(maxsize = None)
+def singularise(word:str) -> str:
+    """
+    Singularise a noun with inflect. The result is cached across descriptions.
+
+    Parameters:
+        word (str): The noun to singularise
+
+    Returns:
+        sing_word (str): The singular form of the noun, or the original word if inflect determines that it is not a noun
+    """
+
+    sing_word = inf.singular_noun(word)
+    return word if sing_word == False else sing_word
+
 def get_word_set(descstr:str) -> Set[str]:
     """
     Get the list of non-stop words from a plant description string.
@@ -24,29 +106,18 @@ def get_word_set(descstr:str) -> Set[str]:
         descset (Set[str]): The set of non-stop words found in the plant description.
     """
 
-    # Gather stop words
-    stop_words = set(stopwords.words('english'))
-
-    # Insert whitespace before/after period, comma, colon, semicolon and brackets
-    descstr = re.sub(r'[^0-9] *\. *[^0-9]', '. ', descstr) # Do not substitute periods in floating-point numbers
-    descstr = re.sub(r'[^0-9] *\. *[0-9]', '. ', descstr) # Substitute periods next to numbers if either side is not a number
-    descstr = re.sub(r'[0-9] *\. *[^0-9]', '. ', descstr)
-    descstr = re.sub(r'[,:;\(\)\[\]{}"\'`“”]', ' ', descstr) # Replace brackets, etc. with space
+    # Insert whitespace before/after period, comma, colon, semicolon and brackets, and collapse numeric ranges
+    descstr = DESC_SUB_RE.sub(desc_sub, descstr)
 
-    # Collapse numeric ranges to single 'word' to check for presence
-    descstr = re.sub(r'([0-9]) *- *([0-9])', r'\1-\2', descstr)
-
-    # Tokenise words, remove stop words, convert to lowercase
-    descset = set([w.lower() for w in nltk.word_tokenize(descstr) if not w.lower() in stop_words])
+    # Gather stop words
+    stop_words = get_stop_words()
 
-    # Remove punctuations & brackets
-    descset = descset.difference({'.'})
+    # Convert to lowercase, tokenise words on whitespace and periods, remove stop words
+    descset = set([w for w in TOKEN_RE.findall(descstr.lower()) if not w in stop_words])
 
     # Singularise nouns (duplicates will automatically be merged since this is a set)
-    descset_n = set([w for w in descset
-                     if nltk.pos_tag([w])[0][1] in ['NN', 'NNS', 'NNPS', 'NNP']])
-    descset_sing_n = set([w if inf.singular_noun(w) == False else inf.singular_noun(w) # inflection may determine that the word is not a noun, in which case use the original word
-                          for w in descset_n])
+    descset_n = set([w for w in descset if is_noun(w)])
+    descset_sing_n = set([singularise(w) for w in descset_n])
     descset = descset.difference(descset_n).union(descset_sing_n) # Remove nouns and add back singulars
 
     # Return word set
@@ -0,0 +1,88 @@
+"""
+Script for defining the ProgressFile class, which records the output of each species as it is processed so that progress is kept if a run halts.
+"""
+
+from typing import Optional
+import orjson
+import os
+
+class ProgressFile:
+    """
+    JSON Lines file at [outputfile].jsonl recording the output of each species as it is stored.
+    Each run first appends a line holding the run metadata, structured as {"metadata": {...}},
+    followed by one line per species structured like the elements of 'data' in the output JSON.
+    The drivers can add their own keys to these lines, e.g. the accumulated character list in the desc2matrix_accum scripts.
+    The file is opened in append mode, so rerunning a halted run with the same output file keeps the species processed before it halted.
+    """
+
+    def __init__(self, outputfile:str, metadata:dict, run_info:Optional[dict] = None, merge_script:Optional[str] = None):
+        """
+        Open the progress file and record the run metadata.
+
+        Parameters:
+            outputfile (str): Path to the output JSON file; the progress file is this path followed by '.jsonl'
+            metadata (dict): The run metadata, i.e. the 'metadata' of the output JSON
+            run_info (Optional[dict]): Other information on the run recorded alongside the metadata, e.g. the initial character list. Defaults to None
+            merge_script (Optional[str]): Name of the script that merges the progress file with the output, if the run mode has one. Defaults to None
+        """
+
+        # Path to the progress file
+        self.path:str = outputfile + '.jsonl'
+
+        # Script suggested for merging the progress file with the output
+        self.merge_script:Optional[str] = merge_script
+
+        # Whether the file already holds the species of an earlier run that halted
+        self.has_earlier_run:bool = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+        # Open in append mode so that the species of an earlier run are kept
+        self.fp = open(self.path, 'ab')
+
+        # Record the metadata of this run
+        self.write(dict(run_info, metadata = metadata) if run_info != None else {'metadata': metadata})
+
+    def __enter__(self) -> 'ProgressFile':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(self, entry:dict) -> None:
+        """
+        Append an entry to the progress file as a line, and flush it so that it is kept if the run halts.
+
+        Parameters:
+            entry (dict): The entry to append, e.g. the stored output of a species
+
+        Returns:
+            None
+        """
+
+        self.fp.write(orjson.dumps(entry) + b'\n')
+        self.fp.flush()
+
+    def close(self) -> None:
+        """
+        Close the progress file.
+
+        Returns:
+            None
+        """
+
+        self.fp.close()
+
+    def remove(self) -> None:
+        """
+        Remove the progress file once the output JSON has been written.
+        The file is kept if it holds the species of an earlier run that halted, as they are not in the output JSON.
+
+        Returns:
+            None
+        """
+
+        if self.has_earlier_run and self.merge_script != None:
+            print('Kept {} as it holds species from an earlier run; merge it with the output using {}'.format(self.path, self.merge_script))
+        elif self.has_earlier_run:
+            print('Kept {} as it holds species from an earlier run, which are not in the output'.format(self.path))
+        else:
+            os.remove(self.path)
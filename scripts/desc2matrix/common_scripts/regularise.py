@@ -1,5 +1,34 @@
-from typing import List, Optional
-import copy
+from typing import List, Dict, Optional
+
+# JSON schema of a charjson, passed to Ollama as the output format so that the LLM can only generate JSON with this structure
+# The structure is [{"characteristic": "", "value": ""}, ...], as checked by regularise_charjson
+CHARJSON_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'characteristic': {'type': 'string'},
+            'value': {'type': 'string'}
+        },
+        'required': ['characteristic', 'value'],
+        'additionalProperties': False
+    }
+}
+
+# JSON schema of a character table, passed to Ollama as the output format
+# The structure is [{"characteristic": "", "values": {"spid1": "", "spid2": "", ...}}, ...], as checked by regularise_table
+TABLE_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'characteristic': {'type': 'string'},
+            'values': {'type': 'object', 'additionalProperties': {'type': 'string'}}
+        },
+        'required': ['characteristic', 'values'],
+        'additionalProperties': False
+    }
+}
 
 def regularise_charjson(chars:List[dict]) -> Optional[List[dict]]:
     """
@@ -20,12 +49,12 @@ def regularise_charjson(chars:List[dict]) -> Optional[List[dict]]:
 
     # Go through elements
     for char in chars:
-        # Return None if the keys are different from what we expect
-        if set(char.keys()) != {'characteristic', 'value'}:
+        # Return None if the element is not a dict with exactly the keys we expect; checked without building sets
+        if not isinstance(char, dict) or len(char) != 2 or 'characteristic' not in char or 'value' not in char:
             return None
         
         # Skip if value is None
-        if char['value'] == None:
+        if char['value'] is None:
             continue
         
         # Convert value to string
@@ -37,6 +66,44 @@ def regularise_charjson(chars:List[dict]) -> Optional[List[dict]]:
     # Return the new dict
     return new_dict
 
+def regularise_batch(batch:Dict[str, List[dict]], spids:List[str]) -> Optional[Dict[str, Optional[List[dict]]]]:
+    """
+    Validate the structure of the output for a batch of species, which is a dict mapping each species ID to a charjson,
+    and regularise the charjson of each species with regularise_charjson().
+
+    Parameters:
+        batch (Dict[str, List[dict]]): The output for a batch of species. The expected structure is {"spid1": [{"characteristic": "", "value": ""}, ...], ...}
+        spids (List[str]): The list of the IDs of the species in the batch
+
+    Returns:
+        new_batch (Optional[Dict[str, Optional[List[dict]]]]): Dict mapping each species ID to its regularised charjson, which is None if it is missing or badly structured. None if the input is not a dict.
+    """
+
+    if not isinstance(batch, dict): # If the batch output is not a dict
+        return None
+
+    # Regularise the charjson of each species separately so that one bad species does not discard the whole batch
+    return {spid: regularise_charjson(batch[spid]) if spid in batch else None for spid in spids}
+
+def batch_schema(spids:List[str]) -> dict:
+    """
+    Build the JSON schema of the output for a batch of species, passed to Ollama as the output format
+    so that the LLM has to answer with a charjson for every species ID in the batch.
+
+    Parameters:
+        spids (List[str]): The list of the IDs of the species in the batch
+
+    Returns:
+        schema (dict): JSON schema of the batch output
+    """
+
+    return {
+        'type': 'object',
+        'properties': {spid: CHARJSON_SCHEMA for spid in spids},
+        'required': list(spids),
+        'additionalProperties': False
+    }
+
 def regularise_table(table:List[dict], spids:List[str] = None) -> Optional[List[dict]]:
     """
     Check whether the character table dict produced by process_descs.get_char_table has a valid structure,
@@ -56,25 +123,29 @@ def regularise_table(table:List[dict], spids:List[str] = None) -> Optional[List[
     if len(table) == 0: # If table is empty, return the table
         return table
 
-    # Variable for storing the list of species IDs
-    spids = copy.deepcopy(spids if spids != None else [])
+    # Variable for storing the set of species IDs, built once and compared against every characteristic
+    spid_set = set(spids) if spids is not None else None
 
     # Variable for storing the output table
     new_table = []
 
     # Go through elements
     for char in table:
-        # Return false if the keys are different from what we expect
-        if set(char.keys()) != {'characteristic', 'values'}:
-            return False
+        # Return None if the element is not a dict with exactly the keys we expect
+        if not isinstance(char, dict) or len(char) != 2 or 'characteristic' not in char or 'values' not in char:
+            return None
+
+        # Return None if the values are not a dict
+        if not isinstance(char['values'], dict):
+            return None
         
         # Set spids if it's empty
-        if len(spids) == 0:
-            spids = char['values'].keys()
+        if not spid_set:
+            spid_set = set(char['values'])
         
-        # Return false if the values are badly structured
-        if set(char['values'].keys()) != set(spids):
-            return False
+        # Return None if the values are badly structured; dict key views compare with sets directly
+        if char['values'].keys() != spid_set:
+            return None
         
         # Convert values to string
         char['values'] = {spid: str(val) for spid, val in char['values'].items()}
@@ -1,11 +1,13 @@
 import argparse
-import json
+import orjson
+import os
 from ollama import Client
-import pandas as pd
 import copy
 
 from common_scripts import default_prompts # Import default prompts
 from common_scripts.accumulator import TabTraitAccumulator # Import class for trait accumulation with tabulation
+from common_scripts.descfile import read_descs # Import function for reading the descfile
+from common_scripts.progressfile import ProgressFile # Import the class for recording progress
 
 def main(sys_prompt, tab_prompt, prompt):
     # Create the parser
@@ -52,20 +54,8 @@ def main(sys_prompt, tab_prompt, prompt):
 
     # ===== Read descfile =====
 
-    # Read descfile
-    descdf = pd.read_csv(args.descfile, sep = '\t')
-
-    # Filter morphological descriptions only
-    descdf = descdf.loc[descdf['type'] == args.desctype]
-
-    # Slice according to --start and --spnum options
-    if(args.spnum != None):
-        descdf = descdf[args.start : args.start + args.spnum]
-    else:
-        descdf = descdf[args.start:]
-
-    # Extract descriptions
-    descs = descdf['description'].tolist()
+    # Read morphological descriptions and species ids from descfile in chunks, sliced according to --start and --spnum options
+    spids, descs = read_descs(args.descfile, args.desctype, args.start, args.spnum)
 
     # ===== Setup Ollama ======
 
@@ -85,28 +75,38 @@ def main(sys_prompt, tab_prompt, prompt):
 
     # ===== Generate initial trait list =====
 
-    accum.extract_init_chars(descdf.iloc[0:args.initspnum]['coreid'], descs[0:args.initspnum], not args.silent)
+    accum.extract_init_chars(spids[0:args.initspnum], descs[0:args.initspnum], not args.silent)
 
     # ===== Accumulate traits =====
 
-    # Loop through each species description
-    for rowid, desc in enumerate(descs):
-        # Log number of species if not silent
-        if(args.silent != True):
-            print('Processing {}/{}'.format(rowid + 1, len(descs)))
-
-        # Get species id
-        spid = descdf.iloc[rowid]['coreid']
-
-        # Accumulate traits using one additional species
-        accum.accum_step(spid, desc, not args.silent)
-
-        # Get summary dict
-        summ_dict = accum.get_summary()
-
-        # Write output as JSON
-        with open(args.outputfile, 'w') as outfile:
-            json.dump(summ_dict, outfile)
+    # Record each output as a line in a JSON Lines file so that progress is kept if the run halts
+    # The file is appended to, starting with a line holding the run metadata and the initial character list
+    # Each species line also holds the character list after the species, so that the character list history is kept
+    with ProgressFile(args.outputfile, accum.get_summary()['metadata'],
+                      run_info = {'charlist': accum.charlist_history[-1], 'charlist_len': len(accum.charlist_history[-1])}) as progressfile:
+        # Loop through each species description
+        for rowid, (spid, desc) in enumerate(zip(spids, descs)):
+            # Log number of species if not silent
+            if(args.silent != True):
+                print('Processing {}/{}'.format(rowid + 1, len(descs)))
+
+            # Accumulate traits using one additional species
+            accum.accum_step(spid, desc, not args.silent)
+
+            # Append the stored output and the updated character list to the progress file
+            progressfile.write(dict(accum.sp_chars[-1], charlist = accum.charlist_history[-1], charlist_len = len(accum.charlist_history[-1])))
+
+    # Get summary dict
+    summ_dict = accum.get_summary()
+
+    # Write output as JSON once all species are processed
+    # The output is written to a temporary file and then renamed, so that a halted run never leaves a truncated output
+    with open(args.outputfile + '.tmp', 'wb') as outfile:
+        outfile.write(orjson.dumps(summ_dict))
+    os.replace(args.outputfile + '.tmp', args.outputfile)
+
+    # Remove the progress file as the full output has been written, unless it holds species from an earlier run
+    progressfile.remove()
 
 if __name__ == '__main__':
     main(default_prompts.global_sys_prompt, default_prompts.global_tablulation_prompt, default_prompts.global_prompt)
\ No newline at end of file
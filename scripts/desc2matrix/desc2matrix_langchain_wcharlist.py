@@ -1,9 +1,12 @@
 import argparse
-import json
-import pandas as pd
+import orjson
+import os
+import asyncio
 
 from common_scripts import default_prompts # Import the default prompts
 from common_scripts.langchainprocessor import LCTraitExtractor # Import the trait extractor class
+from common_scripts.descfile import read_descs # Import function for reading the descfile
+from common_scripts.progressfile import ProgressFile # Import the class for recording progress
 
 def main(prompt):
     # Create the parser
@@ -21,6 +24,7 @@ def main(prompt):
     # Run configs
     parser.add_argument('--start', required = False, type = int, default = 0, help = 'Order ID of the species to start transcribing from')
     parser.add_argument('--spnum', required = False, type = int, help = 'Number of species to process descriptions of. Default behaviour is to process all species present in the file')
+    parser.add_argument('--concurrency', required = False, type = int, default = 4, help = 'Maximum number of descriptions sent to the LLM at once. Default is 4')
 
     # Model properties
     parser.add_argument('--model', required = False, type = str, default = 'mixtral-8x7b-32768', help = 'Name of base LLM to use')
@@ -41,20 +45,8 @@ def main(prompt):
 
     # ===== Read descfile =====
 
-    # Read descfile
-    descdf = pd.read_csv(args.descfile, sep = '\t')
-
-    # Filter morphological descriptions only
-    descdf = descdf.loc[descdf['type'] == args.desctype]
-
-    # Slice according to --start and --spnum options
-    if(args.spnum != None):
-        descdf = descdf[args.start : args.start + args.spnum]
-    else:
-        descdf = descdf[args.start:]
-
-    # Extract descriptions
-    descs = descdf['description'].tolist()
+    # Read morphological descriptions and species ids from descfile in chunks, sliced according to --start and --spnum options
+    spids, descs = read_descs(args.descfile, args.desctype, args.start, args.spnum)
 
     # ===== Read trait list file =====
 
@@ -73,28 +65,56 @@ def main(prompt):
     }
 
     # Initialise trait extractor
-    extractor = LCTraitExtractor(prompt, charlist, args.model, params)
+    extractor = LCTraitExtractor(prompt, charlist, args.model, params, max_concurrency = args.concurrency)
 
     # ===== Generate output =====
 
-    # Loop through each species description
-    for rowid, desc in enumerate(descs):
-        # Log number of species if not silent
-        if(args.silent != True):
-            print('Processing {}/{}'.format(rowid + 1, len(descs)))
-
-        # Get species id
-        spid = descdf.iloc[rowid]['coreid']
-
-        # Generate output for one species with predetermined character list
-        extractor.ext_step(spid, desc, not args.silent)
-
-        # Get summary dict
-        summ_dict = extractor.get_summary()
-
-        # Write output as JSON
-        with open(args.outputfile, 'w') as outfile:
-            json.dump(summ_dict, outfile)
+    # Record each output as a line in a JSON Lines file as it is stored so that progress is kept if the run halts
+    # The file is appended to, starting with a line holding the run metadata
+    progressfile = ProgressFile(args.outputfile, extractor.get_summary()['metadata'], merge_script = 'merge_wcharlist_outs.py')
+
+    async def extract_traits():
+        # Submit all descriptions at once; the extractor limits the number of requests in flight to args.concurrency,
+        # and a new request is sent as soon as any previous one finishes
+        tasks = []
+        # Tasks by description, so that descriptions that are identical apart from whitespace are only sent to the LLM once
+        desc_tasks = {}
+        for spid, desc in zip(spids, descs):
+            desc_key = ' '.join(desc.split())
+            if desc_key not in desc_tasks:
+                desc_tasks[desc_key] = asyncio.create_task(extractor.ext_step_async(spid, desc, store_results = False))
+            tasks.append(desc_tasks[desc_key]) # Species with a repeated description reuse the output of the first one
+
+        # Write to the progress file opened above, closing it when done
+        with progressfile:
+            # Loop through each species in the original order
+            for rowid, task in enumerate(tasks):
+                # Wait for the output for the species
+                char_json = await task
+
+                # Log number of species if not silent
+                if(args.silent != True):
+                    print('Processed {}/{}: {}'.format(rowid + 1, len(descs), char_json['status']))
+
+                # Store the output, preserving the order of the species
+                extractor.store_charjson(spids[rowid], descs[rowid], char_json)
+
+                # Append the stored output to the progress file
+                progressfile.write(extractor.sp_chars[-1])
+
+    asyncio.run(extract_traits())
+
+    # Get summary dict
+    summ_dict = extractor.get_summary()
+
+    # Write output as JSON once all species are processed
+    # The output is written to a temporary file and then renamed, so that a halted run never leaves a truncated output
+    with open(args.outputfile + '.tmp', 'wb') as outfile:
+        outfile.write(orjson.dumps(summ_dict))
+    os.replace(args.outputfile + '.tmp', args.outputfile)
+
+    # Remove the progress file as the full output has been written, unless it holds species from an earlier run
+    progressfile.remove()
 
 if __name__ == '__main__':
     main(default_prompts.global_langchain_ext_prompt)
\ No newline at end of file
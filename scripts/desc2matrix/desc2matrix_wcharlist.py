@@ -1,12 +1,15 @@
 import argparse
-import json
-from ollama import Client
-import pandas as pd
+import asyncio
+import orjson
+import os
+import pyarrow as pa
+from pyarrow import csv as pacsv, compute as pc
 
 from common_scripts import default_prompts # Import the default prompts
 from common_scripts.extractor import TraitExtractor # Import the trait extractor class
+from common_scripts.progressfile import ProgressFile # Import the class for recording progress
 
-def main(sys_prompt, prompt):
+def main(sys_prompt, prompt, batch_prompt):
     # Create the parser
     parser = argparse.ArgumentParser(description = 'Extract JSON/dict from description files')
 
@@ -17,12 +20,17 @@ def main(sys_prompt, prompt):
     parser.add_argument('--desctype', required = True, type = str, help = 'The "type" value used for morphological descriptions in the description file')
     parser.add_argument('--sysprompt', required = False, type = str, help = 'Text file storing the system prompt')
     parser.add_argument('--prompt', required = False, type = str, help = 'Text file storing the prompt')
+    parser.add_argument('--batchprompt', required = False, type = str, help = 'Text file storing the prompt used with --batchsize')
     parser.add_argument('--silent', required = False, action = 'store_true', help = 'Suppress output showing job progress')
     parser.add_argument('--charlistsep', required = False, type = str, default = ',', help = 'Separator character used in charlist file to separate individual trait names')
 
     # Run configs
     parser.add_argument('--start', required = False, type = int, default = 0, help = 'Order ID of the species to start transcribing from')
     parser.add_argument('--spnum', required = False, type = int, help = 'Number of species to process descriptions of. Default behaviour is to process all species present in the file')
+    parser.add_argument('--batchsize', required = False, type = int, default = 1, help = 'Number of descriptions to transcribe in a single prompt. Species missing from the output of a batch are transcribed again separately. Default is 1 (one description per prompt)')
+    parser.add_argument('--concurrency', required = False, type = int, default = int(os.environ.get('OLLAMA_NUM_PARALLEL', 4)), help = 'Maximum number of descriptions to send to the Ollama server at once. Defaults to OLLAMA_NUM_PARALLEL if set, otherwise 4')
+    parser.add_argument('--nocache', required = False, action = 'store_true', help = 'Do not cache the LLM responses. By default, responses are cached in [outputfile].cache and reused when the same description is processed again with the same prompts and model')
+    parser.add_argument('--skiptrivial', required = False, action = 'store_true', help = 'Do not send descriptions that are very short or do not mention any plant part to the LLM; these are stored with the status "skipped"')
 
     # Model properties
     parser.add_argument('--model', required = False, type = str, default = 'llama3', help = 'Name of base LLM to use')
@@ -30,6 +38,7 @@ def main(sys_prompt, prompt):
     parser.add_argument('--seed', required = False, type = int, default = 1, help = 'Model seed value')
     parser.add_argument('--repeatlastn', required = False, type = int, default = 0, help = 'Number of prompts for the model to look back to prevent repetition')
     parser.add_argument('--numpredict', required = False, type = int, default = 2048, help = 'Maximum number of tokens the model can generate')
+    parser.add_argument('--fitnumpredict', required = False, action = 'store_true', help = 'Lower the maximum number of tokens for each description to an estimate based on the lengths of the description and the trait list, capped at --numpredict')
     parser.add_argument('--numctx', required = False, type = int, default = 4096, help = 'Size of context window used to generate the token')
     parser.add_argument('--topk', required = False, type = int, help = 'A higher value (e.g. 100) will give more diverse answers, while a lower value (e.g. 10) will be more conservative.')
     parser.add_argument('--topp', required = False, type = float, help = 'A higher value (e.g., 0.95) will lead to more diverse text, while a lower value (e.g., 0.5) will generate more focused and conservative text.')
@@ -46,23 +55,26 @@ def main(sys_prompt, prompt):
     if(args.prompt != None):
         with open(args.prompt, 'r') as fp:
             prompt = fp.read()
+    if(args.batchprompt != None):
+        with open(args.batchprompt, 'r') as fp:
+            batch_prompt = fp.read()
 
     # ===== Read descfile =====
 
-    # Read descfile
-    descdf = pd.read_csv(args.descfile, sep = '\t')
+    # Read descfile; only the columns needed are parsed, all as strings
+    desccols = ['coreid', 'type', 'description']
+    desctab = pacsv.read_csv(args.descfile,
+                             parse_options = pacsv.ParseOptions(delimiter = '\t', newlines_in_values = True),
+                             convert_options = pacsv.ConvertOptions(include_columns = desccols, column_types = {col: pa.string() for col in desccols}))
 
     # Filter morphological descriptions only
-    descdf = descdf.loc[descdf['type'] == args.desctype]
+    desctab = desctab.filter(pc.equal(desctab['type'], args.desctype))
 
     # Slice according to --start and --spnum options
-    if(args.spnum != None):
-        descdf = descdf[args.start : args.start + args.spnum]
-    else:
-        descdf = descdf[args.start:]
+    desctab = desctab.slice(args.start, args.spnum)
 
     # Extract descriptions
-    descs = descdf['description'].tolist()
+    descs = desctab['description'].to_pylist()
 
     # ===== Read trait list file =====
 
@@ -84,28 +96,75 @@ def main(sys_prompt, prompt):
     }
 
     # Initialise trait extractor
-    extractor = TraitExtractor(sys_prompt, prompt, charlist, args.model, params)
+    extractor = TraitExtractor(sys_prompt, prompt, charlist, args.model, params, max_concurrency = args.concurrency,
+                               cache_path = None if args.nocache else args.outputfile + '.cache', fit_num_predict = args.fitnumpredict,
+                               batch_prompt = batch_prompt, skip_trivial = args.skiptrivial)
 
     # ===== Generate output =====
 
-    # Loop through each species description
-    for rowid, desc in enumerate(descs):
-        # Log number of species if not silent
-        if(args.silent != True):
-            print('Processing {}/{}'.format(rowid + 1, len(descs)))
-
-        # Get species id
-        spid = descdf.iloc[rowid]['coreid']
-
-        # Generate output for one species with predetermined character list
-        extractor.ext_step(spid, desc, not args.silent)
+    # Close the response cache when done, even if the run halts, so that the responses received so far are kept
+    try:
+        # Get species ids
+        spids = desctab['coreid'].to_pylist()
+
+        # Record each output as a line in a JSON Lines file as it is stored so that progress is kept if the run halts
+        # The file is appended to, starting with a line holding the run metadata
+        progressfile = ProgressFile(args.outputfile, extractor.get_summary()['metadata'], merge_script = 'merge_wcharlist_outs.py')
+
+        async def extract_traits():
+            # Order in which the descriptions are put into batches
+            # When batching, descriptions are sorted by length so that long descriptions are batched together;
+            # this keeps the batch prompts, which must all fit in --numctx, of similar length
+            if args.batchsize > 1:
+                order = sorted(range(len(descs)), key = lambda i: len(descs[i]))
+                # Pack up to args.batchsize descriptions into each batch while the batch is estimated to fit in --numctx
+                batches = extractor.pack_batches(descs, order, args.batchsize)
+            else:
+                batches = [[i] for i in range(len(descs))]
+
+            # Submit all descriptions at once, args.batchsize descriptions per prompt, so that the Ollama server can batch them
+            # The extractor limits the number of requests in flight to args.concurrency
+            tasks = [asyncio.create_task(extractor.ext_batch_async([spids[i] for i in batch], [descs[i] for i in batch])) for batch in batches]
+
+            # Task and position within the batch of each species
+            sp_tasks = [None] * len(descs)
+            for batch, task in zip(batches, tasks):
+                for batch_pos, rowid in enumerate(batch):
+                    sp_tasks[rowid] = (task, batch_pos)
+
+            # Write to the progress file opened above, closing it when done
+            with progressfile:
+                # Loop through each species in the original order
+                for rowid, (task, batch_pos) in enumerate(sp_tasks):
+                    # Wait for the outputs for the species in the batch
+                    char_json = (await task)[batch_pos]
+
+                    # Log number of species if not silent
+                    if(args.silent != True):
+                        print('Processed {}/{}: {}'.format(rowid + 1, len(descs), char_json['status']))
+
+                    # Store the output, preserving the order of the species
+                    extractor.store_charjson(spids[rowid], descs[rowid], char_json)
+
+                    # Append the stored output to the progress file
+                    progressfile.write(extractor.sp_chars[-1])
+
+        asyncio.run(extract_traits())
 
         # Get summary dict
         summ_dict = extractor.get_summary()
 
-        # Write output as JSON
-        with open(args.outputfile, 'w') as outfile:
-            json.dump(summ_dict, outfile)
+        # Write output as JSON once all species are processed
+        # The output is written to a temporary file and then renamed, so that a halted run never leaves a truncated output
+        with open(args.outputfile + '.tmp', 'wb') as outfile:
+            outfile.write(orjson.dumps(summ_dict))
+        os.replace(args.outputfile + '.tmp', args.outputfile)
+
+        # Remove the progress file as the full output has been written, unless it holds species from an earlier run
+        progressfile.remove()
+    finally:
+        # Close the response cache
+        extractor.close()
 
 if __name__ == '__main__':
-    main(default_prompts.global_sys_prompt, default_prompts.global_prompt)
\ No newline at end of file
+    main(default_prompts.global_sys_prompt, default_prompts.global_prompt, default_prompts.global_batch_prompt)
\ No newline at end of file
@@ -1,9 +1,12 @@
 import argparse
-import json
-import pandas as pd
+import asyncio
+import orjson
+import os
 
 from common_scripts import default_prompts # Import the default prompts
 from common_scripts.extractor import FollowupTraitExtractor # Import the trait extractor class
+from common_scripts.descfile import read_descs # Import function for reading the descfile
+from common_scripts.progressfile import ProgressFile # Import the class for recording progress
 
 def main(sys_prompt, prompt, f_prompt):
     # Create the parser
@@ -23,6 +26,9 @@ def main(sys_prompt, prompt, f_prompt):
     # Run configs
     parser.add_argument('--start', required = False, type = int, default = 0, help = 'Order ID of the species to start transcribing from')
     parser.add_argument('--spnum', required = False, type = int, help = 'Number of species to process descriptions of. Default behaviour is to process all species present in the file')
+    parser.add_argument('--concurrency', required = False, type = int, default = int(os.environ.get('OLLAMA_NUM_PARALLEL', 4)), help = 'Maximum number of requests to send to the Ollama server at once. Defaults to OLLAMA_NUM_PARALLEL if set, otherwise 4')
+    parser.add_argument('--nocache', required = False, action = 'store_true', help = 'Do not cache the LLM responses. By default, responses are cached in [outputfile].cache and reused when the same description is processed again with the same prompts and model')
+    parser.add_argument('--skiptrivial', required = False, action = 'store_true', help = 'Do not send descriptions that are very short or do not mention any plant part to the LLM; these are stored with the status "skipped"')
 
     # Model properties
     parser.add_argument('--model', required = False, type = str, default = 'llama3', help = 'Name of base LLM to use')
@@ -51,20 +57,8 @@ def main(sys_prompt, prompt, f_prompt):
 
     # ===== Read descfile =====
 
-    # Read descfile
-    descdf = pd.read_csv(args.descfile, sep = '\t')
-
-    # Filter morphological descriptions only
-    descdf = descdf.loc[descdf['type'] == args.desctype]
-
-    # Slice according to --start and --spnum options
-    if(args.spnum != None):
-        descdf = descdf[args.start : args.start + args.spnum]
-    else:
-        descdf = descdf[args.start:]
-
-    # Extract descriptions
-    descs = descdf['description'].tolist()
+    # Read morphological descriptions and species ids from descfile in chunks, sliced according to --start and --spnum options
+    spids, descs = read_descs(args.descfile, args.desctype, args.start, args.spnum)
 
     # ===== Read trait list file =====
 
@@ -86,30 +80,55 @@ def main(sys_prompt, prompt, f_prompt):
     }
 
     # Initialise trait extractor
-    extractor = FollowupTraitExtractor(sys_prompt, prompt, f_prompt, charlist, args.model, params)
+    extractor = FollowupTraitExtractor(sys_prompt, prompt, f_prompt, charlist, args.model, params, max_concurrency = args.concurrency,
+                                       cache_path = None if args.nocache else args.outputfile + '.cache', skip_trivial = args.skiptrivial)
 
     # ===== Generate output =====
 
-    # Loop through each species description
-    for rowid, desc in enumerate(descs):
-        # Log number of species if not silent
-        if(args.silent != True):
-            print('Processing {}/{}'.format(rowid + 1, len(descs)))
-        
-        # Get species id
-        spid = descdf.iloc[rowid]['coreid']
-
-        # Generate output with predetermined character list
-        extractor.ext_step(spid, desc, not args.silent)
-        
+    # Close the response cache when done, even if the run halts, so that the responses received so far are kept
+    try:
+        # Record each output as a line in a JSON Lines file as it is stored so that progress is kept if the run halts
+        # The file is appended to, starting with a line holding the run metadata
+        progressfile = ProgressFile(args.outputfile, extractor.get_summary()['metadata'], merge_script = 'merge_wcharlist_outs.py')
+
+        async def extract_traits():
+            # Submit all descriptions at once so that the Ollama server can process them in parallel
+            # The extractor limits the number of requests in flight to args.concurrency
+            tasks = [asyncio.create_task(extractor.ext_step_async(spid, desc, store_results = False)) for spid, desc in zip(spids, descs)]
+
+            # Write to the progress file opened above, closing it when done
+            with progressfile:
+                # Loop through each species description in order
+                for rowid, (spid, desc, task) in enumerate(zip(spids, descs, tasks)):
+                    # Wait for the output for the species
+                    char_json = await task
+
+                    # Log number of species if not silent
+                    if(args.silent != True):
+                        print('Processed {}/{}: {}'.format(rowid + 1, len(descs), char_json['status']))
+
+                    # Store the output, preserving the order of the species
+                    extractor.store_charjson(spid, desc, char_json)
+
+                    # Append the stored output to the progress file
+                    progressfile.write(extractor.sp_chars[-1])
+
+        asyncio.run(extract_traits())
+
         # Get summary dict
         summ_dict = extractor.get_summary()
 
-        # Write output as JSON
-        with open(args.outputfile, 'w') as outfile:
-            json.dump(summ_dict, outfile)
-
-    
+        # Write output as JSON once all species are processed
+        # The output is written to a temporary file and then renamed, so that a halted run never leaves a truncated output
+        with open(args.outputfile + '.tmp', 'wb') as outfile:
+            outfile.write(orjson.dumps(summ_dict))
+        os.replace(args.outputfile + '.tmp', args.outputfile)
+
+        # Remove the progress file as the full output has been written, unless it holds species from an earlier run
+        progressfile.remove()
+    finally:
+        # Close the response cache
+        extractor.close()
 
 if __name__ == '__main__':
     main(default_prompts.global_sys_prompt, default_prompts.global_prompt, default_prompts.global_followup_prompt)
\ No newline at end of file
@@ -18,6 +18,7 @@ def main(sys_prompt, init_prompt, prompt):
     parser.add_argument('--prompt', required = False, type = str, help = 'Text file storing the prompt')
     parser.add_argument('--initprompt', required = False, type = str, help = 'Text file storing the initial prompt (i.e. prompt without [CHARACTER_LIST])')
     parser.add_argument('--silent', required = False, action = 'store_true', help = 'Suppress output showing job progress')
+    parser.add_argument('--nocache', required = False, action = 'store_true', help = 'Do not cache the LLM responses. By default, responses are cached in [outputfile].cache and reused when the same request is made again with the same model')
 
     # Run configs
     parser.add_argument('--start', required = False, type = int, default = 0, help = 'Order ID of the species to start transcribing from')
@@ -63,8 +64,9 @@ def main(sys_prompt, init_prompt, prompt):
     else:
         descdf = descdf[args.start:]
 
-    # Extract descriptions
+    # Extract descriptions and species ids
     descs = descdf['description'].tolist()
+    spids = descdf['coreid'].tolist()
 
     # ===== Setup Ollama ======
 
@@ -91,80 +93,89 @@ def main(sys_prompt, init_prompt, prompt):
     # Create model with the specified params
     client.create(model = 'desc2matrix', modelfile = modelfile)
 
-    # ===== Generate output =====
-
-    # Dictionary to store the final output along with metadata
-    outdict = {
-        'sys_prompt': sys_prompt,
-        'init_prompt': init_prompt,
-        'prompt': prompt,
-        'params': params,
-        'mode': 'desc2json_accum',
-        'charlist_len_history': [],
-        'charlist_history': [],
-        'data': []
-    }
-
-    # Variable to store extracted characteristic data
-    sp_list = []
-
-    # Variable to store the character list history
-    charlist_history = []
-
-    # Loop through each species description
-    for rowid, desc in enumerate(descs):
-        # Log number of species if not silent
-        if(args.silent != True):
-            print('Processing {}/{}'.format(rowid + 1, len(descs)))
+    # Open the response cache; cached responses are discarded if the modelfile or the base model changed
+    cache = None if args.nocache else process_descs.open_cache(args.outputfile + '.cache', modelfile, client.show(args.model)['modelfile'])
 
-        # Generate output for one species
-        if rowid == 0 or len(charlist_history[rowid - 1]) == 0: # If this is the first species or the first species to succeed
-            # Generate output without predetermined character list
-            char_json = process_descs.desc2charjson(sys_prompt, init_prompt, desc, client, silent = args.silent == True)
-        else: # Otherwise
-            # Get the list of characters from the last row
-            chars = charlist_history[rowid - 1]
-
-            # Generate output with predetermined character list
-            char_json = process_descs.desc2charjson(sys_prompt, prompt, desc, client, chars = chars, silent = args.silent == True)
+    # ===== Generate output =====
 
-        if(char_json['status'] == 'success'): # If run succeeded
-            # Extract character list
-            chars = [char['characteristic'] for char in char_json['data']]
+    # Close the response cache when done, even if the run halts, so that the responses received so far are kept
+    try:
+        # Dictionary to store the final output along with metadata
+        outdict = {
+            'sys_prompt': sys_prompt,
+            'init_prompt': init_prompt,
+            'prompt': prompt,
+            'params': params,
+            'mode': 'desc2json_accum',
+            'charlist_len_history': [],
+            'charlist_history': [],
+            'data': []
+        }
+
+        # Variable to store extracted characteristic data
+        sp_list = []
+
+        # Variable to store the character list history
+        charlist_history = []
+
+        # Loop through each species description
+        for rowid, (spid, desc) in enumerate(zip(spids, descs)):
+            # Log number of species if not silent
+            if(args.silent != True):
+                print('Processing {}/{}'.format(rowid + 1, len(descs)))
+
+            # Generate output for one species
+            if rowid == 0 or len(charlist_history[rowid - 1]) == 0: # If this is the first species or the first species to succeed
+                # Generate output without predetermined character list
+                char_json = process_descs.desc2charjson(sys_prompt, init_prompt, desc, client, silent = args.silent == True, cache = cache)
+            else: # Otherwise
+                # Get the list of characters from the last row
+                chars = charlist_history[rowid - 1]
+
+                # Generate output with predetermined character list
+                char_json = process_descs.desc2charjson(sys_prompt, prompt, desc, client, chars = chars, silent = args.silent == True, cache = cache)
+
+            if(char_json['status'] == 'success'): # If run succeeded
+                # Extract character list
+                chars = [char['characteristic'] for char in char_json['data']]
         
-            # Append only if the new character list is longer or if this is the first entry
-            if(rowid == 0 or len(chars) > len(charlist_history[rowid - 1])):
-                charlist_history.append(chars)
-            else: # Otherwise copy last entry
+                # Append only if the new character list is longer or if this is the first entry
+                if(rowid == 0 or len(chars) > len(charlist_history[rowid - 1])):
+                    charlist_history.append(chars)
+                else: # Otherwise copy last entry
+                    charlist_history.append(copy.deepcopy(charlist_history[rowid - 1]))
+            elif(rowid == 0): # If this is the first species
+                # Append empty list
+                charlist_history.append([])
+            else: # Otherwise
+                # Copy the last entry
                 charlist_history.append(copy.deepcopy(charlist_history[rowid - 1]))
-        elif(rowid == 0): # If this is the first species
-            # Append empty list
-            charlist_history.append([])
-        else: # Otherwise
-            # Copy the last entry
-            charlist_history.append(copy.deepcopy(charlist_history[rowid - 1]))
-
-        # Add entry to sp_list
-        sp_list.append({
-            'coreid': descdf.iloc[rowid]['coreid'],
-            'status': char_json['status'], # Status: one of 'success', 'bad_structure', 'invalid_json'
-            'original_description': descdf.iloc[rowid]['description'],
-            'char_json': char_json['data'] if char_json['status'] == 'success' else None, # Only use this if parsing succeeded
-            'failed_str': char_json['data'] if char_json['status'] != 'success' else None # Only use this if parsing failed
-        })
-        
-        # Store generated outputs
-        outdict['data'] = sp_list
 
-        # Store charlist history
-        outdict['charlist_history'] = charlist_history
-
-        # Store charlist length history
-        outdict['charlist_len_history'] = [len(charlist) for charlist in charlist_history]
-
-        # Write output as JSON
-        with open(args.outputfile, 'w') as outfile:
-            json.dump(outdict, outfile)
+            # Add entry to sp_list
+            sp_list.append({
+                'coreid': spid,
+                'status': char_json['status'], # Status: one of 'success', 'bad_structure', 'invalid_json'
+                'original_description': desc,
+                'char_json': char_json['data'] if char_json['status'] == 'success' else None, # Only use this if parsing succeeded
+                'failed_str': char_json['data'] if char_json['status'] != 'success' else None # Only use this if parsing failed
+            })
+        
+            # Store generated outputs
+            outdict['data'] = sp_list
+
+            # Store charlist history
+            outdict['charlist_history'] = charlist_history
+
+            # Store charlist length history
+            outdict['charlist_len_history'] = [len(charlist) for charlist in charlist_history]
+
+            # Write output as JSON
+            with open(args.outputfile, 'w') as outfile:
+                json.dump(outdict, outfile)
+    finally:
+        # Close the response cache
+        if cache != None:
+            cache.close()
 
 if __name__ == '__main__':
     main(default_prompts.global_sys_prompt, default_prompts.global_init_prompt, default_prompts.global_prompt)
\ No newline at end of file
@@ -18,6 +18,7 @@ def main(sys_prompt, tab_prompt, prompt):
     parser.add_argument('--prompt', required = False, type = str, help = 'Text file storing the prompt')
     parser.add_argument('--tabprompt', required = False, type = str, help = 'Text file storing the prompt to use for tabulating the initial list of characteristics')
     parser.add_argument('--silent', required = False, action = 'store_true', help = 'Suppress output showing job progress')
+    parser.add_argument('--nocache', required = False, action = 'store_true', help = 'Do not cache the LLM responses. By default, responses are cached in [outputfile].cache and reused when the same request is made again with the same model')
 
     # Run configs
     parser.add_argument('--start', required = False, type = int, default = 0, help = 'Order ID of the species to start transcribing from')
@@ -63,8 +64,9 @@ def main(sys_prompt, tab_prompt, prompt):
     else:
         descdf = descdf[args.start:]
 
-    # Extract descriptions
+    # Extract descriptions and species ids
     descs = descdf['description'].tolist()
+    spids = descdf['coreid'].tolist()
 
     # ===== Setup Ollama ======
 
@@ -91,94 +93,101 @@ def main(sys_prompt, tab_prompt, prompt):
     # Create model with the specified params
     client.create(model = 'desc2matrix', modelfile = modelfile)
 
+    # Open the response cache; cached responses are discarded if the modelfile or the base model changed
+    cache = None if args.nocache else process_descs.open_cache(args.outputfile + '.cache', modelfile, client.show(args.model)['modelfile'])
+
     # ===== Generate output =====
 
-    # Dictionary to store the final output along with metadata
-    outdict = {
-        'sys_prompt': sys_prompt,
-        'tab_prompt': tab_prompt,
-        'prompt': prompt,
-        'initspnum': args.initspnum,
-        'params': params,
-        'mode': 'desc2json_accum_tab',
-        'charlist_len_history': [],
-        'charlist_history': [],
-        'data': []
-    }
+    # Close the response cache when done, even if the run halts, so that the responses received so far are kept
+    try:
+        # Dictionary to store the final output along with metadata
+        outdict = {
+            'sys_prompt': sys_prompt,
+            'tab_prompt': tab_prompt,
+            'prompt': prompt,
+            'initspnum': args.initspnum,
+            'params': params,
+            'mode': 'desc2json_accum_tab',
+            'charlist_len_history': [],
+            'charlist_history': [],
+            'data': []
+        }
 
-    # Variable to store extracted characteristic data
-    sp_list = []
+        # Variable to store extracted characteristic data
+        sp_list = []
 
-    # Variable to store the character list history
-    charlist_history = []
+        # Variable to store the character list history
+        charlist_history = []
 
-    # ===== Obtain an initial list of characteristics by tabulation =====
+        # ===== Obtain an initial list of characteristics by tabulation =====
 
-    # Sample a number of species to initially tabulate
+        # Sample a number of species to initially tabulate
 
-    tabdf = descdf.iloc[0:args.initspnum]
+        tabspids = spids[0:args.initspnum]
 
-    # Extract table of characteristics
-    chars_tab = process_descs.get_char_table(sys_prompt, tab_prompt, tabdf['coreid'].tolist(), descs, client, silent = args.silent == True)
+        # Extract table of characteristics
+        chars_tab = process_descs.get_char_table(sys_prompt, tab_prompt, tabspids, descs, client, silent = args.silent == True, cache = cache)
 
-    # Terminate the program if parsing has failed
-    if(chars_tab['status'] != 'success'):
-        raise Exception('Initial tabulation generated bad output with status ' + chars_tab['status'])
+        # Terminate the program if parsing has failed
+        if(chars_tab['status'] != 'success'):
+            raise Exception('Initial tabulation generated bad output with status ' + chars_tab['status'])
 
-    # Extract the initial list of characteristics from the table
-    init_char_list = [char['characteristic'] for char in chars_tab['data']]
+        # Extract the initial list of characteristics from the table
+        init_char_list = [char['characteristic'] for char in chars_tab['data']]
 
-    # Append the char_list to charlist_history
-    charlist_history.append(init_char_list)
+        # Append the char_list to charlist_history
+        charlist_history.append(init_char_list)
 
-    # Loop through each species description
-    for rowid, desc in enumerate(descs):
-        # Log number of species if not silent
-        if(args.silent != True):
-            print('Processing {}/{}'.format(rowid + 1, len(descs)))
+        # Loop through each species description
+        for rowid, (spid, desc) in enumerate(zip(spids, descs)):
+            # Log number of species if not silent
+            if(args.silent != True):
+                print('Processing {}/{}'.format(rowid + 1, len(descs)))
 
-        # Get the list of characters from the last row
-        chars = charlist_history[rowid] # NOT rowid - 1 since there is already one element in the list
+            # Get the list of characters from the last row
+            chars = charlist_history[rowid] # NOT rowid - 1 since there is already one element in the list
 
-        # Generate output with predetermined character list
-        char_json = process_descs.desc2charjson(sys_prompt, prompt, desc, client, chars = chars, silent = args.silent == True)
+            # Generate output with predetermined character list
+            char_json = process_descs.desc2charjson(sys_prompt, prompt, desc, client, chars = chars, silent = args.silent == True, cache = cache)
 
-        if(char_json['status'] == 'success'): # If run succeeded
-            # Extract character list
-            chars = [char['characteristic'] for char in char_json['data']]
+            if(char_json['status'] == 'success'): # If run succeeded
+                # Extract character list
+                chars = [char['characteristic'] for char in char_json['data']]
         
-            # Append only if the new character list is longer or if this is the first entry
-            if(len(chars) > len(charlist_history[rowid])):
-                charlist_history.append(chars)
-            else: # Otherwise copy last entry
+                # Append only if the new character list is longer or if this is the first entry
+                if(len(chars) > len(charlist_history[rowid])):
+                    charlist_history.append(chars)
+                else: # Otherwise copy last entry
+                    charlist_history.append(copy.deepcopy(charlist_history[rowid]))
+            else: # Otherwise
+                # Copy the last entry
                 charlist_history.append(copy.deepcopy(charlist_history[rowid]))
-        else: # Otherwise
-            # Copy the last entry
-            charlist_history.append(copy.deepcopy(charlist_history[rowid]))
-
-        # Add entry to sp_list
-        sp_list.append({
-            'coreid': descdf.iloc[rowid]['coreid'],
-            'status': char_json['status'], # Status: one of 'success', 'bad_structure', 'invalid_json'
-            'original_description': descdf.iloc[rowid]['description'],
-            'char_json': char_json['data'] if char_json['status'] == 'success' else None, # Only use this if parsing succeeded
-            'failed_str': char_json['data'] if char_json['status'] != 'success' else None # Only use this if parsing failed
-        })
-        
-        # Store generated outputs
-        outdict['data'] = sp_list
-
-        # Store charlist history
-        outdict['charlist_history'] = charlist_history
 
-        # Store charlist length history
-        outdict['charlist_len_history'] = [len(charlist) for charlist in charlist_history]
-
-        # Write output as JSON
-        with open(args.outputfile, 'w') as outfile:
-            json.dump(outdict, outfile)
-
-    
+            # Add entry to sp_list
+            sp_list.append({
+                'coreid': spid,
+                'status': char_json['status'], # Status: one of 'success', 'bad_structure', 'invalid_json'
+                'original_description': desc,
+                'char_json': char_json['data'] if char_json['status'] == 'success' else None, # Only use this if parsing succeeded
+                'failed_str': char_json['data'] if char_json['status'] != 'success' else None # Only use this if parsing failed
+            })
+        
+            # Store generated outputs
+            outdict['data'] = sp_list
+
+            # Store charlist history
+            outdict['charlist_history'] = charlist_history
+
+            # Store charlist length history
+            outdict['charlist_len_history'] = [len(charlist) for charlist in charlist_history]
+
+            # Write output as JSON
+            with open(args.outputfile, 'w') as outfile:
+                json.dump(outdict, outfile)
+    finally:
+        # Close the response cache
+        if cache != None:
+            cache.close()
 
 if __name__ == '__main__':
     main(default_prompts.global_sys_prompt, default_prompts.global_tablulation_prompt, default_prompts.global_prompt)
\ No newline at end of file
@@ -17,6 +17,7 @@ def main(sys_prompt, prompt):
     parser.add_argument('--sysprompt', required = False, type = str, help = 'Text file storing the system prompt')
     parser.add_argument('--prompt', required = False, type = str, help = 'Text file storing the prompt')
     parser.add_argument('--silent', required = False, action = 'store_true', help = 'Suppress output showing job progress')
+    parser.add_argument('--nocache', required = False, action = 'store_true', help = 'Do not cache the LLM responses. By default, responses are cached in [outputfile].cache and reused when the same request is made again with the same model')
     parser.add_argument('--charlistsep', required = False, type = str, default = ',', help = 'Separator character used in charlist file to separate individual trait names')
 
     # Run configs
@@ -60,8 +61,9 @@ def main(sys_prompt, prompt):
     else:
         descdf = descdf[args.start:]
 
-    # Extract descriptions
+    # Extract descriptions and species ids
     descs = descdf['description'].tolist()
+    spids = descdf['coreid'].tolist()
 
     # ===== Read trait list file =====
 
@@ -94,45 +96,57 @@ def main(sys_prompt, prompt):
     # Create model with the specified params
     client.create(model = 'desc2matrix', modelfile = modelfile)
 
-    # ===== Generate output =====
+    # Open the response cache; cached responses are discarded if the modelfile or the base model changed
+    cache = None if args.nocache else process_descs.open_cache(args.outputfile + '.cache', modelfile, client.show(args.model)['modelfile'])
 
-    # Dictionary to store the final output along with metadata
-    outdict = {
-        'sys_prompt': sys_prompt,
-        'prompt': prompt,
-        'params': params,
-        'mode': 'desc2json_wcharlist',
-        'charlist': charlist,
-        'data': []
-    }
+    # ===== Generate output =====
 
-    # Variable to store extracted characteristic data
-    sp_list = []
-
-    # Loop through each species description
-    for rowid, desc in enumerate(descs):
-        # Log number of species if not silent
-        if(args.silent != True):
-            print('Processing {}/{}'.format(rowid + 1, len(descs)))
-
-        # Generate output for one species with predetermined character list
-        char_json = process_descs.desc2charjson(sys_prompt, prompt, desc, client, chars = charlist, silent = args.silent == True)
-
-        # Add entry to sp_list
-        sp_list.append({
-            'coreid': descdf.iloc[rowid]['coreid'],
-            'status': char_json['status'], # Status: one of 'success', 'bad_structure', 'invalid_json'
-            'original_description': descdf.iloc[rowid]['description'],
-            'char_json': char_json['data'] if char_json['status'] == 'success' else None, # Only use this if parsing succeeded
-            'failed_str': char_json['data'] if char_json['status'] != 'success' else None # Only use this if parsing failed
-        })
+    # Close the response cache when done, even if the run halts, so that the responses received so far are kept
+    try:
+        # Dictionary to store the final output along with metadata
+        outdict = {
+            'sys_prompt': sys_prompt,
+            'prompt': prompt,
+            'params': params,
+            'mode': 'desc2json_wcharlist',
+            'charlist': charlist,
+            'data': []
+        }
+
+        # Variable to store extracted characteristic data
+        sp_list = []
+
+        # Insert the list of characters into the prompt once, as it is the same for every species
+        prompt_wchars = prompt.replace('[CHARACTER_LIST]', '; '.join(charlist))
+
+        # Loop through each species description
+        for rowid, (spid, desc) in enumerate(zip(spids, descs)):
+            # Log number of species if not silent
+            if(args.silent != True):
+                print('Processing {}/{}'.format(rowid + 1, len(descs)))
+
+            # Generate output for one species with predetermined character list
+            char_json = process_descs.desc2charjson(sys_prompt, prompt_wchars, desc, client, silent = args.silent == True, cache = cache)
+
+            # Add entry to sp_list
+            sp_list.append({
+                'coreid': spid,
+                'status': char_json['status'], # Status: one of 'success', 'bad_structure', 'invalid_json'
+                'original_description': desc,
+                'char_json': char_json['data'] if char_json['status'] == 'success' else None, # Only use this if parsing succeeded
+                'failed_str': char_json['data'] if char_json['status'] != 'success' else None # Only use this if parsing failed
+            })
         
-        # Store generated outputs
-        outdict['data'] = sp_list
-
-        # Write output as JSON
-        with open(args.outputfile, 'w') as outfile:
-            json.dump(outdict, outfile)
+            # Store generated outputs
+            outdict['data'] = sp_list
+
+            # Write output as JSON
+            with open(args.outputfile, 'w') as outfile:
+                json.dump(outdict, outfile)
+    finally:
+        # Close the response cache
+        if cache != None:
+            cache.close()
 
 if __name__ == '__main__':
     main(default_prompts.global_sys_prompt, default_prompts.global_prompt)
\ No newline at end of file
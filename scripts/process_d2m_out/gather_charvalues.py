@@ -4,10 +4,61 @@ desc2matrix_wcharlist_*.py scripts, generating a table of the possible values th
 characteristics can take within the dataset and their frequency of occurrence.
 """
 
-from typing import Dict, Any
-import json
+from typing import Dict, Any, List, Iterator
+import orjson
+import ijson
 import argparse
-from functools import cmp_to_key
+import os
+from collections import defaultdict, Counter
+from itertools import islice
+from multiprocessing import Pool
+
+# Number of species read from the input at a time and counted by one worker process
+# Outputs with fewer species are counted in a single process, as starting the worker processes would cost more than it saves
+SHARD_SPNUM = 1000
+
+def iter_shards(sp_iter:Iterator[dict], shard_size:int) -> Iterator[List[dict]]:
+    """
+    Split a stream of species into lists of at most shard_size species.
+
+    Parameters:
+        sp_iter (Iterator[dict]): Iterator over the species in the desc2matrix output
+        shard_size (int): Number of species per list
+
+    Returns:
+        shards (Iterator[List[dict]]): Iterator over the lists of species
+    """
+
+    shard = list(islice(sp_iter, shard_size))
+    while len(shard) > 0:
+        yield shard
+        shard = list(islice(sp_iter, shard_size))
+
+def count_chars(sp_list:List[dict]) -> Dict[str, Counter]:
+    """
+    Count the occurrences of each value of each characteristic in a list of species from a desc2matrix output.
+    Species that failed to parse are skipped.
+
+    Parameters:
+        sp_list (List[dict]): List of species as in the 'data' of the desc2matrix output
+
+    Returns:
+        chars_dict (Dict[str, Counter]): Dictionary structured as {'characteristic': Counter({'value 1': frequency, ...}), ...}
+    """
+
+    # Characteristics are counted in a defaultdict of Counters
+    chars_dict = defaultdict(Counter)
+
+    # Iterate through species and add charcteristics to chars_dict as appropriate
+    for sp in sp_list:
+        if sp['status'] != 'success': # If the species didn't successfully parse
+            continue # Skip species
+
+        for char in sp['char_json']: # Iterate through individual characteristics
+            # Increase frequency counter; missing characteristics and values start from 0
+            chars_dict[char['characteristic']][char['value']] += 1
+
+    return chars_dict
 
 def main():
     # Create the parser
@@ -23,61 +74,51 @@ def main():
     # Parse the arguments
     args = parser.parse_args()
 
-    # Variable for storing the entire desc2matrix output JSON
-    d2m_output = {}
-
-    # Read file into the variable
-    with open(args.charjsonfile, 'r') as fp:
-        d2m_output = json.load(fp)
-
     # Dictionary for storing the characteristics and their corresponding possible values
     # Structure is {'characteristic': {'value 1': frequency, 'value 2': frequency, ...}, ...} if --charsonly is not true,
     # {'characteristic': frequency, ...} if --charsonly is true.
-    chars_dict:Dict[str, Any] = {}
+    # Values are counted across all species first
 
-    # Iterate through species and add charcteristics to chars_dict as appropriate
-    for sp in d2m_output['data']:
-        if sp['status'] != 'success': # If the species didn't successfully parse
-            continue # Skip species
+    # Stream the species from the file instead of loading the entire desc2matrix output JSON
+    with open(args.charjsonfile, 'rb') as fp:
+        shards = iter_shards(ijson.items(fp, 'data.item'), SHARD_SPNUM)
 
-        for char in sp['char_json']: # Iterate through individual characteristics
-            # Characteristic name and value
-            char_name = char['characteristic']
-            char_val = char['value']
-            if char_name in chars_dict: # If the characteristic is already in chars_dict
-                chars_dict[char_name][char_val] = 1 if not char_val in chars_dict[char_name] else chars_dict[char_name][char_val] + 1 # Increase frequency counter or set frequency as 1
-            else: # If the characteristic doesn't exist
-                chars_dict[char_name] = {} # Initialise dict
-                chars_dict[char_name][char_val] = 1 # Set frequency to 1
+        # Count the first shard in this process
+        first_shard = next(shards, [])
+        chars_dict:Dict[str, Any] = count_chars(first_shard)
+
+        if len(first_shard) == SHARD_SPNUM: # If more species may follow
+            with Pool() as pool:
+                # Count one shard per CPU at a time so that only a few shards are held in memory
+                for shard_group in iter(lambda: list(islice(shards, os.cpu_count())), []):
+                    # Merge the counts of each shard
+                    for shard_chars in pool.imap(count_chars, shard_group):
+                        for char_name, char_vals in shard_chars.items():
+                            chars_dict[char_name].update(char_vals)
 
     # 'Sort' dictionary
-    # Sort values
-    chars_dict = {char_name: dict(sorted(chars_dict[char_name].items())) for char_name in chars_dict} # Sort values alphabetically
-    if args.sortvalbyfreq: # If --sortvalbyfreq is true,
+    # Without --sortvalbyfreq / --sortcharbyfreq, values and characteristic names are only sorted alphabetically when writing the output
+    sort_by_freq = args.sortvalbyfreq or args.sortcharbyfreq
+    if sort_by_freq:
+        # Sort keys for values and characteristics; ties in frequency are broken alphabetically
+        val_sort_key = (lambda val: (-val[1], val[0])) if args.sortvalbyfreq else (lambda val: val[0])
+        char_sort_key = (lambda char: (-sum(char[1].values()), char[0])) if args.sortcharbyfreq else (lambda char: char[0])
+
+        # Sort characteristics and their values in a single pass
         chars_dict = {
-            char_name: dict(sorted(
-                chars_dict[char_name].items(),
-                key = cmp_to_key(lambda l, r: r[1] - l[1]) # Compare the frequencies, this will be negative if the left item should go before the right
-            )) for char_name in chars_dict
-        } # Sort values by frequency
-
-    # Sort characters
-    chars_dict = dict(sorted(chars_dict.items())) # Sort characteristic names alphabetically
-    if args.sortcharbyfreq: # If --sortcharbyfreq is true,
-        chars_dict = dict(sorted(
-            chars_dict.items(),
-            key = cmp_to_key(lambda l, r: sum([rvfreq for rv, rvfreq in r[1].items()]) - sum([lvfreq for lv, lvfreq in l[1].items()]))
-        )) # Sort characters by frequency
+            char_name: dict(sorted(char_vals.items(), key = val_sort_key))
+            for char_name, char_vals in sorted(chars_dict.items(), key = char_sort_key)
+        }
 
     # Collapse values if --charsonly is true
     if args.charsonly:
         chars_dict = {
-            char_name: sum([vfreq for v, vfreq in char_vals.items()]) # Take the sum of all the value frequencies
+            char_name: sum(char_vals.values()) # Take the sum of all the value frequencies
             for char_name, char_vals in chars_dict.items()
         }
 
-    with open(args.outputfile, 'w') as fp:
-        json.dump(chars_dict, fp)
+    with open(args.outputfile, 'wb') as fp:
+        fp.write(orjson.dumps(chars_dict, option = 0 if sort_by_freq else orjson.OPT_SORT_KEYS))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
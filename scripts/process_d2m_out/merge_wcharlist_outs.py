@@ -1,37 +1,107 @@
 """
 This script can be used to merge two JSON output files from a desc2matrix_wcharlist script.
 This is useful for when the script was halted and resumed where it stopped, resulting in two separate files.
+Either file can also be the [outputfile].jsonl progress file left by a halted run.
 NB: This DOES NOT support merging two desc2matrix_accum outputs together.
 """
 
+from typing import Iterator
+from collections import Counter
 import argparse
-import json
+import orjson
+import ijson
+
+def iter_progress_lines(path:str) -> Iterator[dict]:
+    """
+    Iterate over the entries of a .jsonl progress file written by a desc2matrix_wcharlist script.
+    The file holds a {"metadata": {...}} line at the start of each run, followed by one line per species.
+    A last line cut off by the run halting is skipped.
+
+    Parameters:
+        path (str): Path to the progress file
+
+    Returns:
+        entry_iter (Iterator[dict]): Iterator over the metadata and species entries
+    """
+
+    with open(path, 'rb') as fp:
+        for line in fp:
+            if line.endswith(b'\n'): # Complete line
+                yield orjson.loads(line)
+
+def read_metadata(path:str) -> dict:
+    """
+    Read the metadata of a desc2matrix_wcharlist output file or progress file without loading the species data.
+
+    Parameters:
+        path (str): Path to the desc2matrix_wcharlist output file, or to the .jsonl progress file
+
+    Returns:
+        metadata (dict): The run metadata
+    """
+
+    if path.endswith('.jsonl'):
+        # Metadata of every run recorded in the progress file
+        run_metas = [entry['metadata'] for entry in iter_progress_lines(path) if 'metadata' in entry]
+        if len(run_metas) == 0:
+            raise Exception('{} has no metadata'.format(path))
+        if any(run_meta != run_metas[0] for run_meta in run_metas):
+            raise Exception('The runs recorded in {} do not have the same metadata'.format(path))
+        return run_metas[0]
+
+    with open(path, 'rb') as fp:
+        return next(ijson.items(fp, 'metadata', use_float = True))
+
+def iter_species(path:str) -> Iterator[dict]:
+    """
+    Iterate over the species in a desc2matrix_wcharlist output file or progress file, streaming them from the file.
+    A progress file holds the species of a resumed run again if the runs overlap; these repeats are skipped.
+    A species is identified by its coreid and description, as a coreid can have several descriptions.
+
+    Parameters:
+        path (str): Path to the desc2matrix_wcharlist output file, or to the .jsonl progress file
+
+    Returns:
+        sp_iter (Iterator[dict]): Iterator over the species
+    """
+
+    if path.endswith('.jsonl'):
+        # Number of times each species has been yielded
+        yielded_counts = Counter()
+        # Number of times each species occurs in the current run
+        run_counts = Counter()
+        for entry in iter_progress_lines(path):
+            if 'metadata' in entry: # Start of a run
+                run_counts = Counter()
+                continue
+            sp_key = (entry['coreid'], entry['original_description'])
+            run_counts[sp_key] += 1
+            # Yield the species unless an earlier run already yielded it as many times
+            if run_counts[sp_key] > yielded_counts[sp_key]:
+                yielded_counts[sp_key] += 1
+                yield entry
+        return
+
+    with open(path, 'rb') as fp:
+        yield from ijson.items(fp, 'data.item', use_float = True)
 
 def main():
     # Create the parser
     parser = argparse.ArgumentParser(description='Merge two desc2matrix_wcharlist_*.py outputs together')
 
     # Add the arguments
-    parser.add_argument('part1', type=str, help='The first part of the JSON file')
-    parser.add_argument('part2', type=str, help='The second part of the JSON file')
+    parser.add_argument('part1', type=str, help='The first part of the JSON file, or the .jsonl progress file of a halted run')
+    parser.add_argument('part2', type=str, help='The second part of the JSON file, or the .jsonl progress file of a halted run')
     parser.add_argument('outfile', type=str, help='Output file to write the merged JSON')
 
     # Parse the arguments
     args = parser.parse_args()
 
-    # Read the JSON files
-    part1_dict:dict = {}
-    part2_dict:dict = {}
-    with open(args.part1, 'r') as fp:
-        part1_dict = json.loads(fp.read())
-    with open(args.part2, 'r') as fp:
-        part2_dict = json.loads(fp.read())
-
     # ===== Check uniformity between the two output files =====
 
-    # Extract metadata from the two files
-    part1_meta = part1_dict['metadata']
-    part2_meta = part2_dict['metadata']
+    # Read metadata from the two files; the species data are streamed from the files when merging
+    part1_meta = read_metadata(args.part1)
+    part2_meta = read_metadata(args.part2)
     
     # Check if the run modes are wcharlist
     if not (part1_meta['mode'].startswith('desc2json_wcharlist') and part2_meta['mode'].startswith('desc2json_wcharlist')):
@@ -43,11 +113,13 @@ def main():
     
     # Check if the prompts are the same
     prompt_names = ['sys_prompt', 'prompt', 'tab_prompt', 'f_prompt', 'init_prompt']
-    if False in [part1_meta.get(prompt_name) == part2_meta.get(prompt_name) for prompt_name in prompt_names]:
+    if any(part1_meta.get(prompt_name) != part2_meta.get(prompt_name) for prompt_name in prompt_names):
         raise Exception('One or more prompts do not match between the two files')
     
     # Check if the model parameters are the same
-    if False in [part1_meta['params'][param_name] == part2_meta['params'][param_name] for param_name in part1_meta['params']]:
+    part1_params = part1_meta['params']
+    part2_params = part2_meta['params']
+    if any(part1_params[param_name] != part2_params[param_name] for param_name in part1_params):
         raise Exception('One or more model parameter values do not match between the two files')
     
     # Check if the charlists used for extraction are the same
@@ -56,29 +128,31 @@ def main():
 
     # ===== Merge the two JSON files =====
 
-    # Extract set of WFO IDs from two files
-    part1_ids = {sp['coreid'] for sp in part1_dict['data']}
-    part2_ids = {sp['coreid'] for sp in part2_dict['data']}
-    
-    # Find shared WFO IDs
-    shared_ids = part1_ids.intersection(part2_ids)
+    # Set of WFO IDs in part 1
+    part1_ids = set()
 
-    # Start with all the entries in part 1
-    final_data:list = part1_dict['data']
+    # Whether any species has been written yet
+    has_written = False
 
-    # Loop through part 2, appending entries that are not shared between the two parts into the final data
-    for sp in part2_dict['data']:
-        if sp['coreid'] not in shared_ids: # If the coreid is not in the set of shared ids
-            final_data.append(sp)
-    
-    # Build final output from part 1
-    final_dict = part1_dict
-    # Replace data in final dict
-    final_dict['data'] = final_data
-
-    # Write final dict into the output file
-    with open(args.outfile, 'w') as fp:
-        json.dump(final_dict, fp)
+    # Write the merged output, one species at a time
+    with open(args.outfile, 'wb') as fp:
+        # Use the metadata from part 1
+        fp.write(b'{"metadata":' + orjson.dumps(part1_meta) + b',"data":[')
+
+        # Start with all the entries in part 1
+        for sp in iter_species(args.part1):
+            # Write the species, separated by commas
+            fp.write((b',' if has_written else b'') + orjson.dumps(sp))
+            has_written = True
+            part1_ids.add(sp['coreid'])
+
+        # Loop through part 2, appending entries that are not shared between the two parts
+        for sp in iter_species(args.part2):
+            if sp['coreid'] not in part1_ids: # If the coreid is not in part 1
+                fp.write((b',' if has_written else b'') + orjson.dumps(sp))
+                has_written = True
+
+        fp.write(b']}')
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -2,22 +2,27 @@
 Functions related to processing the SDD-formatted species key file.
 """
 
-from typing import List, Literal
+from typing import List, Literal, Tuple, Dict, Optional
 import re
 import copy
+import functools
 
-def get_epithets(sp_name:str) -> List[str]:
+# Regex for the epithets in a species name, ignoring the hybrid sign
+EPITHET_RE = re.compile(r'×?([A-Za-z]+)×?')
+
+@functools.lru_cache(maxsize = None)
+def get_epithets(sp_name:str) -> Tuple[str, ...]:
     """
-    Split a species name into epithets.
+    Split a species name into epithets. The result is cached, since the same names are split many times when mapping species lists.
 
     Parameters:
         sp_name (str): Scientific name of species
 
     Returns:
-        epithets (List[str]): Epithets
+        epithets (Tuple[str, ...]): Epithets
     """
 
-    return re.findall(r'×?([A-Za-z]+)×?', sp_name)
+    return tuple(EPITHET_RE.findall(sp_name))
 
 def spname_identity(binom:str, test:str) -> bool:
     """
@@ -33,10 +38,10 @@ def spname_identity(binom:str, test:str) -> bool:
     """
 
     # Capture epithets from binom string
-    binom_parts:List[str] = get_epithets(binom)
+    binom_parts:Tuple[str, ...] = get_epithets(binom)
     
     # Capture epithets from test string
-    test_parts:List[str] = get_epithets(test)
+    test_parts:Tuple[str, ...] = get_epithets(test)
 
     # Check if the epithets in the binom string match those in the test string
     is_represented:bool = False not in [
@@ -59,33 +64,48 @@ def map_spnames(origin_spp:List[str], target_spp:List[str], match_direction:Lite
         found_ids (List[int]): List of ids equal to the length of origin_spp that maps origin_spp to target_spp
     """
 
-    # Bind spp and ids as a list of tuples
-    spp_pairs = list(enumerate(target_spp))
+    # spname_identity(binom, test) is True exactly when the epithets of binom are the first epithets of test,
+    # so species are matched by looking up epithet tuples and their prefixes instead of comparing every pair of species
+
+    # Split each target species into epithets once
+    target_parts = [get_epithets(target_sp) for target_sp in target_spp]
+
+    # Dicts mapping the epithets of target species (or their prefixes) to the id of the first target species with them
+    target_ids:Dict[Tuple[str, ...], int] = {}
+    target_prefix_ids:Dict[Tuple[str, ...], int] = {}
+    for target_id, parts in enumerate(target_parts):
+        target_ids.setdefault(parts, target_id)
+        for i in range(0, len(parts) + 1):
+            target_prefix_ids.setdefault(parts[:i], target_id)
+
+    # Id of the first target species represented by origin_sp, i.e. whose epithets start with those of origin_sp
+    def find_target_in_origin(origin_parts:Tuple[str, ...]) -> Optional[int]:
+        return target_prefix_ids.get(origin_parts)
+
+    # Id of the first target species representing origin_sp, i.e. whose epithets are the first epithets of origin_sp
+    def find_origin_in_target(origin_parts:Tuple[str, ...]) -> Optional[int]:
+        found = [target_ids[origin_parts[:i]] for i in range(0, len(origin_parts) + 1) if origin_parts[:i] in target_ids]
+        return min(found) if len(found) > 0 else None
 
     # List to store the found coreids
     found_ids:List[int] = []
 
-    # Define function for matching
-    def match_func(origin_sp, target_sp):
+    # Iterate through every species names in spp
+    for origin_sp in origin_spp:
+        origin_parts = get_epithets(origin_sp)
+        # Save the id of the first matching species in target_spp
+        # If there are no matches, insert None
         match match_direction:
             case 'origin_in_target':
-                return spname_identity(target_sp, origin_sp)
+                found_id = find_origin_in_target(origin_parts)
             case 'target_in_origin':
-                return spname_identity(origin_sp, target_sp)
+                found_id = find_target_in_origin(origin_parts)
             case 'either':
-                return spname_identity(target_sp, origin_sp) or spname_identity(origin_sp, target_sp)
-            case 'both':
-                return spname_identity(target_sp, origin_sp) and spname_identity(origin_sp, target_sp)
-
-    # Iterate through every species names in spp
-    for origin_sp in origin_spp:
-        # Get a list of species in spp which are considered to be represented by new_sp
-        match_list = list(filter(lambda sp_pair: match_func(origin_sp, sp_pair[1]), spp_pairs))
-        # Save the id corresponding to the first item in the list
-        # If there are no matches, insert None
-        found_ids.append(
-            match_list[0][0] if len(match_list) > 0 else None
-        )
+                found = [cand_id for cand_id in [find_origin_in_target(origin_parts), find_target_in_origin(origin_parts)] if cand_id != None]
+                found_id = min(found) if len(found) > 0 else None
+            case 'both': # Both species represent each other only if their epithets are the same
+                found_id = target_ids.get(origin_parts)
+        found_ids.append(found_id)
 
     # Return id mappings
     return found_ids
@@ -1,9 +1,14 @@
 import argparse
 import json
+import sys
 import pandas as pd
+from multiprocessing import Pool
 
 from common_scripts import desc_nlp
 
+# Number of descriptions sent to a worker process at once
+WORDSET_CHUNKSIZE = 32
+
 def main():
     # Create the parser
     parser = argparse.ArgumentParser(description='Get word coverage data from desc2matrix.py output file')
@@ -29,12 +34,21 @@ def main():
                        else (desc['failed_str'] if 'failed_str' in desc else '') # failed_str may not exist; put empty string if this is the case
                        for desc in desc_output]
 
-    # Get word sets
-    descsets = [desc_nlp.get_word_set(desc) for desc in descs]
-    descsets_f = [desc_nlp.get_word_set(desc_f) for desc_f in descs_formatted]
+    # Get word sets, processing the descriptions in parallel over all CPUs
+    with Pool() as pool:
+        descsets = pool.map(desc_nlp.get_word_set, descs, chunksize = WORDSET_CHUNKSIZE)
+        descsets_f = pool.map(desc_nlp.get_word_set, descs_formatted, chunksize = WORDSET_CHUNKSIZE)
+
+    # Intern the words, as every word set is unpickled from the worker processes with its own copies of the strings;
+    # the sets then share one copy of each word, and the sets are made immutable
+    descsets = [frozenset(map(sys.intern, descset)) for descset in descsets]
+    descsets_f = [frozenset(map(sys.intern, descset_f)) for descset_f in descsets_f]
+
+    # Rows of the results, collected before building the dataframe at once
+    rows = []
 
-    # Dataframe to store the results
-    df = pd.DataFrame(columns = [
+    # Columns of the results
+    columns = [
         'coreid', # WFO taxon ID
         'status', # Status of LLM transcription to JSON: "success", "bad_structure", or "invalid_json"
         'nwords_original', # Number of words in the original text
@@ -46,23 +60,23 @@ def main():
         'common_words', # Comma-separated list of words that the original and output text share
         'original_only', # Comma-separated list of words only found in the original text
         'result_only' # Comma-separated list of words only found in the output text
-    ])
+    ]
 
     # Go through each description
-    for i, descset, descset_f, desc_dat in zip(list(range(0, len(descsets))), descsets, descsets_f, desc_output):
-        # Calculate word match proportions
-        common_words = sorted(descset.intersection(descset_f))
-        original_only = sorted(descset.difference(descset_f))
-        result_only = sorted(descset_f.difference(descset))
+    for descset, descset_f, desc_dat in zip(descsets, descsets_f, desc_output):
+        # Calculate word match proportions; the words only in either text are the remainders of the common words
+        common_set = descset & descset_f
+        common_words = sorted(common_set)
+        original_only = sorted(descset - common_set)
+        result_only = sorted(descset_f - common_set)
         nwords_recovered = len(common_words)
         nwords_omitted = len(original_only)
         nwords_created = len(result_only)
         nwords_original = len(descset)
         nwords_result = len(descset_f)
-        prop_recovered = round(nwords_recovered / len(descset), 3)
 
-        # Store data in dataframe
-        df.loc[i] = [
+        # Store data in rows; prop_recovered is calculated once the dataframe is built
+        rows.append([
             desc_dat['coreid'],
             desc_dat['status'],
             nwords_original,
@@ -70,11 +84,11 @@ def main():
             nwords_recovered,
             nwords_omitted,
             nwords_created,
-            prop_recovered,
+            None,
             ','.join(common_words),
             ','.join(original_only),
             ','.join(result_only)
-        ]
+        ])
 
         # Print output if --verbose
         if(args.verbose):
@@ -82,6 +96,14 @@ def main():
             print('Words only in the original description:\n{}\n'.format(', '.join(original_only)))
             print('Words only in the script output:\n{}\n'.format(', '.join(result_only)))
     
+    # Build dataframe from the rows
+    df = pd.DataFrame(rows, columns = columns)
+
+    # Calculate the proportion of words in the original text recovered for all descriptions at once
+    # Each proportion is rounded with Python's round() rather than Series.round(), which rounds some values differently (e.g. 1/80),
+    # so that the values match those of earlier runs
+    df['prop_recovered'] = (df['nwords_recovered'] / df['nwords_original']).map(lambda prop: round(prop, 3))
+    
     # Write df to tsv
     df.to_csv(args.outfile, sep = '\t')
 
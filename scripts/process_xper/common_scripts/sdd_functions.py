@@ -1,10 +1,53 @@
 import xmltodict
-from typing import Optional
+from typing import Optional, Iterator, Union
+from io import BytesIO
 import re
 
-def getcharcodes_cat(sddxml:str, rm_keywords:list[str] = ['clade', 'distribution']) -> dict:
+# Use lxml to stream the XML if it is installed; otherwise the whole XML is parsed with xmltodict
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Regex for removing the authors from a taxon name
+AUTHOR_RE = re.compile(r'^([A-Z][^A-Z]*[a-z])')
+
+def parse_sddxml(sddxml:Union[str, bytes]) -> dict:
+    """
+    Parse an SDD-formatted XML string and extract the dataset.
+    The dataset can be passed to the dataset2* functions so that the XML only needs to be parsed once.
+
+    Parameters:
+        sddxml (Union[str, bytes]): Raw XML string, or the raw bytes of the XML file
+
+    Returns:
+        sdd_dataset (dict): The parsed dataset
+    """
+
+    # Parse the raw XML
+    sdd_dict:dict = xmltodict.parse(sddxml)
+
+    # Extract the dataset only
+    return sdd_dict['Datasets']['Dataset']
+
+def getcharcodes_cat(sddxml:Union[str, bytes], rm_keywords:list[str] = ['clade', 'distribution']) -> dict:
     """
     Extract the categorical character codes from the SDD-formatted XML file.
+    See dataset2charcodes_cat() for the structure of the output.
+
+    Parameters:
+        sddxml (Union[str, bytes]): Raw XML string, or the raw bytes of the XML file
+        rm_keywords (list[str]): List of keywords to use for removing certain characteristics
+    
+    Returns:
+        cat_char_codes (dict): Output dictionary
+    """
+
+    return dataset2charcodes_cat(parse_sddxml(sddxml), rm_keywords)
+
+def dataset2charcodes_cat(sdd_dataset:dict, rm_keywords:list[str] = ['clade', 'distribution']) -> dict:
+    """
+    Extract the categorical character codes from an SDD dataset parsed by parse_sddxml().
     The output dict is structured as follows:
 
     {
@@ -19,17 +62,13 @@ def getcharcodes_cat(sddxml:str, rm_keywords:list[str] = ['clade', 'distribution
     }
 
     Parameters:
-        sddxml (str): Raw XML string
+        sdd_dataset (dict): Parsed SDD dataset
         rm_keywords (list[str]): List of keywords to use for removing certain characteristics
     
     Returns:
         cat_char_codes (dict): Output dictionary
     """
 
-    # Parse the raw XML
-    sdd_dict:dict = xmltodict.parse(sddxml)
-
-    sdd_dataset:dict = sdd_dict['Datasets']['Dataset'] # Extract the dataset only
     characters:dict = sdd_dataset['Characters'] # Get labelled characteristics
 
     # ===== Retrieve characteristics, values, and corresponding codes =====
@@ -42,7 +81,7 @@ def getcharcodes_cat(sddxml:str, rm_keywords:list[str] = ['clade', 'distribution
         # Characteristic name
         char_name = cat_char['Representation']['Label'].lower().strip()
         # If at least one of the rm_keywords is in the characteristic name
-        if True in [rm_keyword in char_name for rm_keyword in rm_keywords]:
+        if any(rm_keyword in char_name for rm_keyword in rm_keywords):
             continue # Skip over
 
         # Add an entry in the dictionary
@@ -58,9 +97,23 @@ def getcharcodes_cat(sddxml:str, rm_keywords:list[str] = ['clade', 'distribution
     # Return output dictionary
     return cat_char_codes
 
-def getcharcodes_quant(sddxml:str) -> dict:
+def getcharcodes_quant(sddxml:Union[str, bytes]) -> dict:
     """
     Extract the quantitative character codes from the SDD-formatted XML file.
+    See dataset2charcodes_quant() for the structure of the output.
+
+    Parameters:
+        sddxml (Union[str, bytes]): Raw XML string, or the raw bytes of the XML file
+    
+    Returns:
+        quant_char_codes (dict): Output dictionary
+    """
+
+    return dataset2charcodes_quant(parse_sddxml(sddxml))
+
+def dataset2charcodes_quant(sdd_dataset:dict) -> dict:
+    """
+    Extract the quantitative character codes from an SDD dataset parsed by parse_sddxml().
     The output dict is structured as follows:
 
     {
@@ -72,16 +125,12 @@ def getcharcodes_quant(sddxml:str) -> dict:
     }
 
     Parameters:
-        sddxml (str): Raw XML string
+        sdd_dataset (dict): Parsed SDD dataset
     
     Returns:
-        cat_char_codes (dict): Output dictionary
+        quant_char_codes (dict): Output dictionary
     """
 
-    # Parse the raw XML
-    sdd_dict:dict = xmltodict.parse(sddxml)
-
-    sdd_dataset:dict = sdd_dict['Datasets']['Dataset'] # Extract the dataset only
     characters:dict = sdd_dataset['Characters'] # Get labelled characteristics
 
     # ===== Retrieve characteristics, values, and corresponding codes =====
@@ -101,7 +150,207 @@ def getcharcodes_quant(sddxml:str) -> dict:
     # Return output dictionary
     return quant_char_codes
 
-def sddxml2dict(sddxml:str) -> dict:
+def sort_charcodes(cat_char_codes:dict, quant_char_codes:dict) -> list[tuple[str, dict]]:
+    """
+    Merge the categorical and quantitative character codes into a single list sorted by the name of the characteristic.
+    The list only needs to be sorted once, and is then used by summarydata2chars() for every species.
+
+    Parameters:
+        cat_char_codes (dict): Categorical character codes (see dataset2charcodes_cat())
+        quant_char_codes (dict): Quantitative character codes (see dataset2charcodes_quant())
+
+    Returns:
+        char_codes (list[tuple[str, dict]]): List of (character ID, character code entry) pairs
+    """
+
+    # Sort characteristics; categorical characteristics come first if names are identical
+    return sorted(list(cat_char_codes.items()) + list(quant_char_codes.items()), key = lambda char_code: char_code[1]['characteristic'])
+
+def summarydata2chars(sp_raw_chars:dict, char_codes:list[tuple[str, dict]]) -> list:
+    """
+    Convert the coded characteristics of a species into a list of characteristics and values, sorted by the name of the characteristic.
+
+    Parameters:
+        sp_raw_chars (dict): SummaryData of the species, structured as parsed by xmltodict
+        char_codes (list[tuple[str, dict]]): Character codes sorted by sort_charcodes()
+
+    Returns:
+        sp_chars (list): List of characteristics, structured as [{"characteristic": (name of characteristic), "value": (corresponding value)}, ...]
+    """
+
+    # Species characteristics
+    sp_chars:list = []
+
+    # Index the raw characteristics of the species by their codes
+    cat_chars_byref:dict = {cat_char['@ref']: cat_char for cat_char in sp_raw_chars.get('Categorical', [])}
+    quant_chars_byref:dict = {quant_char['@ref']: quant_char for quant_char in sp_raw_chars.get('Quantitative', [])}
+
+    # Gather characteristics in the sorted order
+    for char_code, char_info in char_codes:
+        if char_info['type'] == 'categorical':
+            # Find characteristic with char_code for the species
+            cat_char:Optional[dict] = cat_chars_byref.get(char_code)
+
+            # Put None if character value is not found or not given
+            if cat_char == None or 'State' not in cat_char:
+                sp_chars.append({
+                    'characteristic': char_info['characteristic'],
+                    'value': None
+                })
+                continue
+
+            # String representing the characteristic value
+            val_str:str = ''
+
+            # Check if there are multiple categorical values
+            if isinstance(cat_char['State'], list): # If there are more than one categorical value
+                val_str = '; '.join([
+                    char_info['values'][char_state['@ref']] for char_state in cat_char['State']
+                ]) # Join multiple values together with semicolon
+            else: # If there is only one categorical value
+                val_str = char_info['values'][cat_char['State']['@ref']]
+
+            # Strip val_str
+            val_str = val_str.strip()
+
+            # Append item to sp_chars
+            sp_chars.append({
+                'characteristic': char_info['characteristic'],
+                'value': val_str
+            })
+        else:
+            # Find characteristic with char_code for the species
+            quant_char:Optional[dict] = quant_chars_byref.get(char_code)
+
+            # Put None if character value is not found or not given
+            if quant_char == None or 'Measure' not in quant_char:
+                sp_chars.append({
+                    'characteristic': char_info['characteristic'],
+                    'value': None
+                })
+                continue
+
+            # Value range
+            vals = [float(val['@value']) for val in quant_char['Measure']]
+            val_min = min(vals)
+            val_max = max(vals)
+            # Units for the characteristic value
+            units = char_info['units']
+
+            # Set value string, with units appended to end
+            if val_min == val_max: # Single value if range minimum and maximum are identical
+                val_str:str = '{} {}'.format(val_min, units)
+            else: # Range if range minimum and maximum are different
+                val_str:str = '{}-{} {}'.format(val_min, val_max, units)
+
+            # Append characteristic
+            sp_chars.append({
+                'characteristic': char_info['characteristic'],
+                'value': val_str
+            })
+
+    return sp_chars
+
+def iterparse_sddxml(sddxml:Union[str, bytes], tags:tuple[str, ...]) -> Iterator:
+    """
+    Stream an SDD-formatted XML string with lxml, yielding the elements with the given tags once they are fully parsed.
+    Each element is cleared after it is processed, so that only a small part of the XML is kept in memory.
+
+    Parameters:
+        sddxml (Union[str, bytes]): Raw XML string, or the raw bytes of the XML file
+        tags (tuple[str, ...]): Tags of the elements to yield
+
+    Returns:
+        elems (Iterator): Iterator over the parsed elements
+    """
+
+    # Parse the bytes as they are, so that lxml decodes them using the encoding declared in the XML
+    if isinstance(sddxml, str):
+        sddxml = sddxml.encode('utf-8')
+
+    for _, elem in etree.iterparse(BytesIO(sddxml), events = ('end',), tag = tags):
+        yield elem
+        # Free the element and the elements before it once it is processed
+        elem.clear()
+        while elem.getprevious() != None:
+            del elem.getparent()[0]
+
+def sddxml2dict_stream(sddxml:Union[str, bytes]) -> dict:
+    """
+    Convert a SDD XML string into a structured dict of species descriptions, streaming the XML with lxml.
+    The output is identical to that of sddxml2dict(), but the whole XML is never held in memory as a dict.
+    The characters are defined before the coded descriptions in SDD, so each species is converted as soon as it is parsed.
+
+    Parameters:
+        sddxml (Union[str, bytes]): Raw XML string, or the raw bytes of the XML file
+
+    Returns:
+        desc_dict (dict): Output dictionary
+    """
+
+    # Character codes, filled in as the characters are parsed
+    cat_char_codes:dict = {}
+    quant_char_codes:dict = {}
+    # Sorted character codes, set once all characters are parsed
+    char_codes:Optional[list] = None
+    # Dict for storing species descriptions
+    spp_chars:dict = {}
+
+    for elem in iterparse_sddxml(sddxml, ('CategoricalCharacter', 'QuantitativeCharacter', 'CodedDescription')):
+        if elem.tag == 'CategoricalCharacter':
+            # Characteristic name
+            char_name = elem.findtext('Representation/Label').lower().strip()
+            # Skip over characteristics that dataset2charcodes_cat() would remove
+            if any(rm_keyword in char_name for rm_keyword in ['clade', 'distribution']):
+                continue
+
+            # Add an entry in the dictionary
+            cat_char_codes[elem.get('id')] = {
+                'type': 'categorical',
+                'characteristic': char_name,
+                'values': {
+                    statedef.get('id'): statedef.findtext('Representation/Label').lower().strip()
+                    for statedef in elem.iterfind('States/StateDefinition')
+                }
+            }
+        elif elem.tag == 'QuantitativeCharacter':
+            # Add an entry in the dictionary
+            quant_char_codes[elem.get('id')] = {
+                'type': 'quantitative',
+                'characteristic': elem.findtext('Representation/Label').lower().strip(),
+                'units': elem.findtext('MeasurementUnit/Label').lower().strip()
+            }
+        else:
+            # Sort the character codes when the first species is reached
+            if char_codes == None:
+                char_codes = sort_charcodes(cat_char_codes, quant_char_codes)
+
+            # Species binomial
+            sp_fullname:str = elem.findtext('Representation/Label')
+            sp_name:str = AUTHOR_RE.match(sp_fullname).group(1) # Remove author
+
+            # Raw species characteristics, structured as parsed by xmltodict
+            sp_raw_chars:dict = {'Categorical': [], 'Quantitative': []}
+            for cat_char in elem.iterfind('SummaryData/Categorical'):
+                raw_char = {'@ref': cat_char.get('ref')}
+                states = [{'@ref': state.get('ref')} for state in cat_char.iterfind('State')]
+                if len(states) > 0:
+                    raw_char['State'] = states
+                sp_raw_chars['Categorical'].append(raw_char)
+            for quant_char in elem.iterfind('SummaryData/Quantitative'):
+                raw_char = {'@ref': quant_char.get('ref')}
+                measures = [{'@value': measure.get('value')} for measure in quant_char.iterfind('Measure')]
+                if len(measures) > 0:
+                    raw_char['Measure'] = measures
+                sp_raw_chars['Quantitative'].append(raw_char)
+
+            # Append species characteristics to spp_chars
+            spp_chars[sp_name] = summarydata2chars(sp_raw_chars, char_codes)
+
+    # Return species characteristics dict
+    return spp_chars
+
+def sddxml2dict(sddxml:Union[str, bytes]) -> dict:
     """
     Convert a SDD XML string into a structured dict of species descriptions.
     The output dict is structured as follows:
@@ -113,23 +362,28 @@ def sddxml2dict(sddxml:str) -> dict:
     }
 
     Parameters:
-        sddxml (str): Raw XML string
+        sddxml (Union[str, bytes]): Raw XML string, or the raw bytes of the XML file
 
     Returns:
         desc_dict (dict): Output dictionary
     """
 
-    # Parse the raw XML
-    sdd_dict:dict = xmltodict.parse(sddxml)
-    
-    sdd_dataset:dict = sdd_dict['Datasets']['Dataset'] # Extract the dataset only
+    # Stream the XML if lxml is installed
+    if etree != None:
+        return sddxml2dict_stream(sddxml)
+
+    # Parse the raw XML once; the dataset is shared by the functions retrieving the characteristic codes
+    sdd_dataset:dict = parse_sddxml(sddxml)
     coded_descs:list = sdd_dataset['CodedDescriptions']['CodedDescription'] # Get coded descriptions of each species
 
     # ===== Retrieve characteristics, values, and corresponding codes =====
     
     # Retrieve characteristic codes
-    cat_char_codes:dict = getcharcodes_cat(sddxml)
-    quant_char_codes:dict = getcharcodes_quant(sddxml)
+    cat_char_codes:dict = dataset2charcodes_cat(sdd_dataset)
+    quant_char_codes:dict = dataset2charcodes_quant(sdd_dataset)
+
+    # Sort characteristic codes by name once for all species
+    char_codes:list = sort_charcodes(cat_char_codes, quant_char_codes)
     
     # ===== Retrieve coded descriptions of species =====
     
@@ -140,109 +394,40 @@ def sddxml2dict(sddxml:str) -> dict:
     for sp in coded_descs:
         # Species binomial
         sp_fullname:str = sp['Representation']['Label']
-        sp_name:str = re.match(r'^([A-Z][^A-Z]*[a-z])', sp_fullname).group(1) # Remove author
-        # Species characteristics
-        sp_chars:list = []
-        # Raw species characteristics
-        sp_raw_chars:dict = sp['SummaryData']
-        
-        # Gather categorical characteristics
-        for cat_char_code in cat_char_codes:
-            # Find characteristic with cat_char_code for the species
-            cat_chars = [cat_char for cat_char in sp_raw_chars['Categorical'] if cat_char['@ref'] == cat_char_code]
-
-            # String representing the characteristic value
-            val_str:Optional[str] = ''
-
-            # Put None if character value is not found
-            if len(cat_chars) == 0:
-                val_str = None
-
-            # Retrieve characteristic
-            cat_char = cat_chars[0]
-            
-            if 'State' not in cat_char: # Put None if character value is not given
-                val_str = None
-            else:
-                # Check if there are multiple categorical values
-                if isinstance(cat_char['State'], list): # If there are more than one categorical value
-                    val_str = '; '.join([
-                        cat_char_codes[cat_char['@ref']]['values'][char_state['@ref']] for char_state in cat_char['State']
-                    ]) # Join multiple values together with semicolon
-                else: # If there is only one categorical value
-                    val_str = cat_char_codes[cat_char['@ref']]['values'][cat_char['State']['@ref']]
-            
-            # Strip val_str
-            val_str = val_str.strip()
+        sp_name:str = AUTHOR_RE.match(sp_fullname).group(1) # Remove author
 
-            # Append item to sp_chars
-            sp_chars.append({
-                'characteristic': cat_char_codes[cat_char['@ref']]['characteristic'],
-                'value': val_str
-            })
-        
-        # Gether quantitative characteristics
-        for quant_char_code in quant_char_codes:
-            # Find characteristic with quant_char_code for the species
-            quant_chars = [quant_char for quant_char in sp_raw_chars['Quantitative'] if quant_char['@ref'] == quant_char_code]
-
-            # String representing the characteristic value
-            val_str:Optional[str] = ''
-
-            # Put None if character value is not found
-            if len(quant_chars) == 0:
-                val_str = None
-
-            # Retrieve characteristic
-            quant_char = quant_chars[0]
-
-            if 'Measure' not in quant_char: # Put None if character value is not given
-                val_str = None
-            else:
-                # Value range (sort so that the minimum value comes first)
-                val_range = sorted([float(val['@value']) for val in quant_char['Measure']])
-
-                # Set value string
-                val_str = str(
-                    val_range[0] if val_range[0] == val_range[1] # Single value if range minimum and maximum are identical
-                    else '{}-{}'.format(*val_range) # Range if range minimum and maximum are different
-                ) + ' ' + quant_char_codes[quant_char['@ref']]['units'] # Append units to end
-                
-            # Append characteristic
-            sp_chars.append({
-                'characteristic': quant_char_codes[quant_char['@ref']]['characteristic'],
-                'value': val_str
-            })
-
-        # Sort characteristics
-        sp_chars = sorted(sp_chars, key = lambda char: char['characteristic'])
-        
         # Append species characteristics to spp_chars
-        spp_chars[sp_name] = sp_chars
+        spp_chars[sp_name] = summarydata2chars(sp['SummaryData'], char_codes)
 
     # Return species characteristics dict
     return spp_chars
 
-def sddxml2spplist(sddxml:str) -> list[str]:
+def sddxml2spplist(sddxml:Union[str, bytes]) -> list[str]:
     """
     Extract the list of species from an SDD-formatted XML string
 
     Parameters:
-        sddxml (str): Raw XML string
+        sddxml (Union[str, bytes]): Raw XML string, or the raw bytes of the XML file
 
     Returns:
         spp_list (list[str]): Output list of species
     """
 
-    # Parse the raw XML
-    sdd_dict:dict = xmltodict.parse(sddxml)
-    
-    sdd_dataset:dict = sdd_dict['Datasets']['Dataset'] # Extract the dataset only
+    # Stream the XML if lxml is installed
+    if etree != None:
+        return [
+            AUTHOR_RE.match(taxon.findtext('Representation/Label')).group(1) # Remove the authors
+            for taxon in iterparse_sddxml(sddxml, ('TaxonName',))
+            if taxon.getparent().tag == 'TaxonNames' # Skip over references to taxa in the coded descriptions, etc.
+        ]
+
+    # Parse the raw XML and extract the dataset
+    sdd_dataset:dict = parse_sddxml(sddxml)
     taxa:list = sdd_dataset['TaxonNames']['TaxonName'] # Extract taxa
 
     # Retrieve list of taxon names
     taxon_names:list[str] = [
-        re.match(r'^([A-Z][^A-Z]*[a-z])', taxon['Representation']['Label']).group(1) # Remove the authors
+        AUTHOR_RE.match(taxon['Representation']['Label']).group(1) # Remove the authors
         for taxon in taxa
     ]
 
@@ -4,6 +4,7 @@ This script converts an SDD-formatted XML file into a list of plant traits.
 
 import argparse
 import json
+import itertools
 from common_scripts import sdd_functions # Functions for processing SDD-formatted XML string
 
 def main():
@@ -19,25 +20,21 @@ def main():
     args = parser.parse_args()
 
     # Read XML file
-    xmlstr:str = ''
-    with open(args.sddfile, 'r') as fp:
+    xmlstr:bytes = b''
+    with open(args.sddfile, 'rb') as fp: # Read as bytes; the XML parser decodes them using the encoding declared in the XML
         xmlstr = fp.read()
 
+    # Parse the XML once
+    sdd_dataset = sdd_functions.parse_sddxml(xmlstr)
+
     # Get coded categorical and quantitative characteristics
-    charcodes_cat = sdd_functions.getcharcodes_cat(xmlstr)
-    charcodes_quant = sdd_functions.getcharcodes_quant(xmlstr)
-
-    # Extract list of characteristics mentioned in the SDD file
-    char_list:list[str] = []
-    char_list.extend([
-        charinfo['characteristic'] for charid, charinfo in charcodes_cat.items()
-    ])
-    char_list.extend([
-        charinfo['characteristic']for charid, charinfo in charcodes_quant.items()
-    ])
-
-    # Sort list of traits
-    char_list.sort()
+    charcodes_cat = sdd_functions.dataset2charcodes_cat(sdd_dataset)
+    charcodes_quant = sdd_functions.dataset2charcodes_quant(sdd_dataset)
+
+    # Extract sorted list of characteristics mentioned in the SDD file
+    char_list:list[str] = sorted(
+        charinfo['characteristic'] for charinfo in itertools.chain(charcodes_cat.values(), charcodes_quant.values())
+    )
 
     # Write list to outfile
     with open(args.outfile, 'w') as fp:
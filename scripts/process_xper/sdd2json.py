@@ -3,7 +3,7 @@ This script converts an SDD-formatted XML file from Xper into a JSON file contai
 """
 
 import argparse
-import json
+import orjson
 from common_scripts import sdd_functions # Functions for processing SDD-formatted XML files
 
 def main():
@@ -21,15 +21,16 @@ def main():
     final_dict:dict = {}
 
     # Read XML file
-    xmlstr:str = ''
-    with open(args.sddfile, 'r') as fp:
+    xmlstr:bytes = b''
+    with open(args.sddfile, 'rb') as fp: # Read as bytes; the XML parser decodes them using the encoding declared in the XML
         xmlstr = fp.read()
     
     # Convert string to chardict
     final_dict = sdd_functions.sddxml2dict(xmlstr)
 
-    with open(args.outfile, 'w') as fp:
-        json.dump(final_dict, fp)
+    # Write JSON output; orjson writes compact UTF-8 without escaping the non-ASCII characters in the taxon names
+    with open(args.outfile, 'wb') as fp:
+        fp.write(orjson.dumps(final_dict))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -21,8 +21,8 @@ def main():
     spp_list:list[str] = []
 
     # Read and parse XML file
-    xmlstr:str = ''
-    with open(args.sddfile, 'r') as fp:
+    xmlstr:bytes = b''
+    with open(args.sddfile, 'rb') as fp: # Read as bytes; the XML parser decodes them using the encoding declared in the XML
         xmlstr = fp.read()
     
     # Extract species list